@@ -1,11 +1,9 @@
 import streamlit as st
-from PIL import Image
+from utils.logo import sidebar_logo
 
 st.set_page_config(page_title="Home", page_icon="🏠")
 
-image_path = 'imagem_fome_zero.png'
-image = Image.open(image_path)
-st.sidebar.image(image, width = 100)
+st.sidebar.image(sidebar_logo(), width = 100)
 st.sidebar.markdown('# Fome Zero')
 st.sidebar.markdown("""---""")
 
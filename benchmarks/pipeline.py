@@ -0,0 +1,330 @@
+""" Headless benchmarks of the dashboard data pipeline and page computations
+
+    Usage:
+        python -m benchmarks.pipeline [--scales 1 10 100 1000] [--output bench_output.json] [--no-memory] [--synthetic]
+        python -m benchmarks.pipeline --compare old.json new.json
+
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import data_loader
+from utils.data_loader import DATASET_PATH, rename_columns, country_column, optimize_dtypes, load_dataset
+from utils.countries import build_country_cube
+from utils.cities import build_city_rankings, build_rating_histogram, rating_band, top_cities
+from utils.cuisines import build_cuisine_index, build_cuisine_summary, build_rating_order, top_cuisines, top_restaurants
+from utils.filters import build_filter_index, filter_dataset, selection_mask
+from utils.maps import build_markers, marker_data
+from utils.spatial import build_spatial_index
+from utils.sketches import SKETCH_COLUMNS, build_sketches
+from utils.incremental import apply_delta, build_country_members, update_artifacts
+from benchmarks.synthetic import write_dataset
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+DEFAULT_OUTPUT = 'bench_output.json'
+
+# Rows per chunk of the streaming snapshot stage
+STREAMING_CHUNK_ROWS = 100000
+
+# Share of the restaurants changed, and as many deleted, by the incremental refresh stages
+DELTA_FRACTION = 0.01
+
+# Relative slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def scaled_copy(csv_path, factor, directory, synthetic = False):
+
+    """ This function writes a copy of the dataset with factor times its rows
+
+        Operations:
+        1- Reads the original csv once
+        2- With synthetic, generates factor times its rows from its distributions instead of repeating it
+        3- Otherwise appends factor copies of it, shifting the Restaurant ID of each copy so no row is a duplicate
+        4- Writes chunk by chunk, so memory stays at the size of the original dataset
+        5- At scale 1 copies the csv as it is, so the snapshots built by the stages are written in the
+           output directory and never next to the production dataset
+
+        Input: Csv path, scale factor, output directory, synthetic (True or False)
+        Output: Path of the scaled csv
+
+    """
+
+    path = os.path.join(directory, 'zomato_x{}.csv'.format(factor))
+
+    if factor == 1 and not synthetic:
+        return shutil.copyfile(csv_path, path)
+
+    df = pd.read_csv(csv_path)
+    offset = int(df['Restaurant ID'].max()) + 1
+
+    if synthetic:
+        return write_dataset(path, factor * len(df), chunk_size = len(df) * 10)
+
+    for i in range(factor):
+        df.assign(**{'Restaurant ID': df['Restaurant ID'] + i * offset}).to_csv(path, mode = 'w' if i == 0 else 'a', header = i == 0, index = False)
+
+    return path
+
+
+
+
+
+def sample_delta(df1, fraction = DELTA_FRACTION):
+
+    """ This function builds a delta over the cleaned dataset
+
+        Operations:
+        1- Samples twice the fraction of the restaurants
+        2- Changes the aggregate_rating of half of them and deletes the other half
+
+        Input: Cleaned Dataframe, fraction of the restaurants changed
+        Output: Delta, as returned by read_delta
+
+    """
+
+    rows = df1.sample(frac = min(2 * fraction, 1), random_state = 0)
+    changed, deleted = rows.iloc[::2, :], rows.iloc[1::2, :]
+    upserts = changed.assign(aggregate_rating = (4.9 - changed['aggregate_rating']).round(1))
+
+    return {'upserts': upserts.reset_index(drop = True), 'deleted': deleted['restaurant_id'].to_numpy()}
+
+
+
+
+
+def measure(func, memory = True):
+
+    """ This function runs a stage and measures it
+
+        Operations:
+        1- Times one run with time.perf_counter
+        2- When memory is True, runs the stage again under tracemalloc to read the peak memory
+           and the number of memory blocks allocated and still alive at the end of the stage
+
+        Input: Function without arguments, memory (True or False)
+        Output: Result of the function, dictionary of measures
+
+    """
+
+    start = time.perf_counter()
+    result = func()
+    measures = {'seconds': time.perf_counter() - start}
+
+    if memory:
+        del result
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = func()
+        after = tracemalloc.take_snapshot()
+        measures['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        measures['allocations'] = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'lineno'))
+        tracemalloc.stop()
+
+    return result, measures
+
+
+
+
+
+def run_stages(csv_path, memory = True):
+
+    """ This function benchmarks every stage of the pipeline and of the page computations
+
+        Operations:
+        1- Measures the csv read, each cleaning step and the columnar snapshot
+        2- Measures the structures built once per dataset version
+        3- Measures the per rerun page computations with every country and cuisine selected
+
+        Input: Csv path, memory (True or False)
+        Output: List of (stage, measures)
+
+    """
+
+    results = []
+
+    def stage(name, func):
+        result, measures = measure(func, memory)
+        results.append((name, measures))
+        return result
+
+    df = stage('read_csv', lambda: pd.read_csv(csv_path))
+    df1 = stage('rename_columns', lambda: rename_columns(df))
+    country = stage('country_mapping', lambda: country_column(df1['country_code']))
+    df1['country'] = country
+    df1 = stage('optimize_dtypes', lambda: optimize_dtypes(df1))
+    del df
+
+    try:
+        from utils.ingest import build_snapshot, load_snapshot
+    except ImportError:
+        pass
+    else:
+        stage('build_snapshot', lambda: build_snapshot(csv_path, chunk_size = 0))
+        stage('build_snapshot_streaming', lambda: build_snapshot(csv_path, chunk_size = STREAMING_CHUNK_ROWS))
+        stage('load_snapshot', lambda: load_snapshot(csv_path))
+
+    data_loader.clear_cache()
+    loaded = load_dataset(csv_path)
+
+    countries = list(df1['country'].unique())
+    cuisines = list(df1['cuisines'].dropna().unique())
+
+    cube = stage('countries_cube', lambda: build_country_cube(df1))
+    stage('cuisine_index', lambda: build_cuisine_index(df1))
+    stage('rating_order', lambda: build_rating_order(df1))
+    stage('filter_index', lambda: build_filter_index(df1))
+    histogram = stage('rating_histogram', lambda: build_rating_histogram(df1))
+    stage('country_sketches', lambda: {col: build_sketches(df1, ['country'], col) for col in SKETCH_COLUMNS})
+    stage('spatial_index', lambda: build_spatial_index(df1))
+    stage('markers', lambda: build_markers(df1))
+
+    stage('filter_countries', lambda: loaded.loc[selection_mask('country', countries, csv_path), :].reset_index())
+    stage('filter_cuisines', lambda: loaded.loc[selection_mask('country', countries, csv_path) & selection_mask('cuisines', cuisines, csv_path), :].reset_index())
+    filtered = filter_dataset(countries, cuisines, path = csv_path)
+
+    rankings = stage('city_rankings', lambda: build_city_rankings(countries, csv_path))
+    stage('rating_comparison_over', lambda: top_cities(rating_band(rankings['rating_histogram'], 4, over = True), 100, 'restaurant_id'))
+    stage('rating_comparison_under', lambda: top_cities(rating_band(rankings['rating_histogram'], 2.5, over = False), 100, 'restaurant_id'))
+    summary = stage('cuisine_summary', lambda: build_cuisine_summary(filtered, cuisines, csv_path))
+    stage('top_cuisines', lambda: (top_cuisines(summary, ascending = False), top_cuisines(summary, ascending = True)))
+    stage('top_biggest_restaurants', lambda: top_restaurants(filtered, 100, csv_path))
+    stage('overview_markers', lambda: marker_data(countries, path = csv_path))
+
+    artifacts = {'country_cube': cube, 'country_members': build_country_members(loaded), 'rating_histogram': histogram,
+                 'cuisine_summary': OrderedDict([((frozenset(countries), frozenset(cuisines)), summary)])}
+    df_new, removed, added = stage('apply_delta', lambda: apply_delta(loaded, sample_delta(loaded)))
+    stage('update_aggregates', lambda: update_artifacts(artifacts, loaded, df_new, removed, added))
+
+    data_loader.clear_cache()
+
+    return results
+
+
+
+
+
+def git_commit():
+
+    """ This function returns the commit of the working tree, or None outside a git checkout
+
+        Input: None
+        Output: Commit hash
+
+    """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True, check = True,
+                              cwd = data_loader.ROOT_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+
+
+
+def run_benchmarks(scales, output, memory = True, synthetic = False):
+
+    """ This function runs the benchmarks over the dataset and its scaled copies
+
+        Operations:
+        1- Writes a scaled copy of the dataset for each scale, repeated or synthetic
+        2- Runs every stage over it
+        3- Saves the measures and the environment to a json file
+
+        Input: List of scale factors, output path, memory (True or False), synthetic (True or False)
+        Output: Report dictionary
+
+    """
+
+    report = {'commit': git_commit(),
+              'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(),
+              'pandas': pd.__version__,
+              'numpy': np.__version__,
+              'synthetic': synthetic,
+              'results': []}
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for scale in scales:
+
+            csv_path = scaled_copy(DATASET_PATH, scale, directory, synthetic)
+
+            for stage, measures in run_stages(csv_path, memory):
+                report['results'].append(dict(scale = scale, stage = stage, **measures))
+                print('x{:<5} {:<26} {:>10.4f}s'.format(scale, stage, measures['seconds']), file = sys.stderr)
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent = 2)
+
+    return report
+
+
+
+
+
+def compare_reports(old_path, new_path, threshold = REGRESSION_THRESHOLD):
+
+    """ This function compares the timings of two benchmark reports
+
+        Operations:
+        1- Joins the results of both reports by scale and stage
+        2- Computes the relative change of the wall time
+        3- Flags the stages slower than the threshold
+
+        Input: Old report path, new report path, regression threshold
+        Output: Comparison Dataframe
+
+    """
+
+    read = lambda path: pd.DataFrame(json.load(open(path))['results']).set_index(['scale', 'stage'])['seconds']
+    aux = pd.concat([read(old_path).rename('old_seconds'), read(new_path).rename('new_seconds')], axis = 1, join = 'inner')
+    aux['change'] = aux['new_seconds'] / aux['old_seconds'] - 1
+    aux['regression'] = aux['change'] > threshold
+
+    return aux
+
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Benchmarks the dashboard data pipeline and page computations')
+    parser.add_argument('--scales', type = int, nargs = '+', default = DEFAULT_SCALES)
+    parser.add_argument('--output', default = DEFAULT_OUTPUT)
+    parser.add_argument('--no-memory', action = 'store_true', help = 'skip the tracemalloc pass')
+    parser.add_argument('--synthetic', action = 'store_true', help = 'generate the scaled datasets instead of repeating the rows')
+    parser.add_argument('--compare', nargs = 2, metavar = ('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        comparison = compare_reports(*args.compare)
+        print(comparison.to_string())
+        sys.exit(1 if comparison['regression'].any() else 0)
+
+    run_benchmarks(args.scales, args.output, memory = not args.no_memory, synthetic = args.synthetic)
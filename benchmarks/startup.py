@@ -0,0 +1,187 @@
+""" Cold-start import time of every Streamlit page
+
+    Usage:
+        python -m benchmarks.startup [--runs 5] [--top 10] [--output startup_output.json]
+
+"""
+
+import os
+import ast
+import sys
+import json
+import glob
+import time
+import argparse
+import subprocess
+
+from utils.data_loader import ROOT_DIR
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+DEFAULT_RUNS = 5
+DEFAULT_TOP = 10
+DEFAULT_OUTPUT = 'startup_output.json'
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def page_paths(root = ROOT_DIR):
+
+    """ This function lists the Home page and every page of the pages directory
+
+        Input: Project root
+        Output: List of page paths
+
+    """
+
+    return [os.path.join(root, 'Home.py')] + sorted(glob.glob(os.path.join(root, 'pages', '*.py')))
+
+
+
+
+
+def page_imports(path):
+
+    """ This function extracts the module level import statements of a page
+
+        Operations:
+        1- Parses the page without running it
+        2- Keeps the import statements at the top level of the page, which run on every cold start,
+           leaving out the imports made inside functions, which only run when a chart is built
+
+        Input: Page path
+        Output: Source code with the import statements
+
+    """
+
+    with open(path, encoding = 'utf-8') as file:
+        tree = ast.parse(file.read())
+
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+
+
+
+def parse_importtime(stderr):
+
+    """ This function reads the output of python -X importtime
+
+        Operations:
+        1- Keeps the cumulative time of every imported module
+        2- Sums the top level modules, which already include the modules they import
+
+        Input: Standard error of the interpreter
+        Output: Total seconds, dictionary of cumulative seconds by module
+
+    """
+
+    total = 0
+    modules = {}
+
+    for line in stderr.splitlines():
+
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        seconds = int(cumulative) / 1e6
+        modules[name.strip()] = seconds
+
+        # Nested imports are indented under the module that imported them
+        if not name[1:].startswith(' '):
+            total += seconds
+
+    return total, modules
+
+
+
+
+
+def measure_page(path, runs = DEFAULT_RUNS):
+
+    """ This function measures the cold-start imports of a page
+
+        Operations:
+        1- Runs the page imports in a fresh interpreter for each run, so nothing is cached in sys.modules
+        2- Times the whole interpreter and reads the import times reported by -X importtime
+        3- Keeps the median run
+
+        Input: Page path, number of runs
+        Output: Dictionary of measures
+
+    """
+
+    code = page_imports(path)
+    measures = []
+
+    for _ in range(runs):
+
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd = ROOT_DIR, capture_output = True, text = True)
+        seconds = time.perf_counter() - start
+
+        if process.returncode != 0:
+            return {'page': os.path.basename(path), 'error': process.stderr.strip().splitlines()[-1]}
+
+        imports, modules = parse_importtime(process.stderr)
+        measures.append({'page': os.path.basename(path), 'wall_seconds': seconds, 'import_seconds': imports, 'modules': modules})
+
+    return sorted(measures, key = lambda x: x['import_seconds'])[len(measures) // 2]
+
+
+
+
+
+def run_startup(runs = DEFAULT_RUNS, top = DEFAULT_TOP, output = DEFAULT_OUTPUT):
+
+    """ This function measures every page and saves the report
+
+        Operations:
+        1- Measures the imports of each page
+        2- Keeps the top slowest modules of each page
+        3- Saves the report to a json file
+
+        Input: Number of runs, number of modules kept per page, output path
+        Output: Report dictionary
+
+    """
+
+    report = {'python': sys.version.split()[0], 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pages': []}
+
+    for path in page_paths():
+
+        result = measure_page(path, runs)
+
+        if 'error' in result:
+            print('{:<22} {}'.format(result['page'], result['error']), file = sys.stderr)
+        else:
+            result['modules'] = dict(sorted(result['modules'].items(), key = lambda x: -x[1])[:top])
+            print('{:<22} imports {:>7.3f}s   wall {:>7.3f}s'.format(result['page'], result['import_seconds'], result['wall_seconds']), file = sys.stderr)
+
+        report['pages'].append(result)
+
+    with open(output, 'w') as file:
+        json.dump(report, file, indent = 2)
+
+    return report
+
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Measures the cold-start import time of every page')
+    parser.add_argument('--runs', type = int, default = DEFAULT_RUNS)
+    parser.add_argument('--top', type = int, default = DEFAULT_TOP, help = 'slowest modules kept per page')
+    parser.add_argument('--output', default = DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    run_startup(args.runs, args.top, args.output)
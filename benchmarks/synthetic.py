@@ -0,0 +1,289 @@
+""" Synthetic Zomato-shaped datasets for scale testing
+
+    Usage:
+        python -m benchmarks.synthetic OUTPUT.csv --rows 10000000 [--chunk-size 500000] [--seed 0] [--cities-per-city 1]
+        python -m benchmarks.synthetic OUTPUT.feather --rows 10000000
+
+"""
+
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+DEFAULT_CHUNK_SIZE = 500000
+
+# Raw csv schema, in the original column order
+COLUMNS = ['Restaurant ID', 'Restaurant Name', 'Country Code', 'City', 'Address', 'Locality', 'Locality Verbose',
+           'Longitude', 'Latitude', 'Cuisines', 'Average Cost for two', 'Currency', 'Has Table booking',
+           'Has Online delivery', 'Is delivering now', 'Switch to order menu', 'Price range', 'Aggregate rating',
+           'Rating color', 'Rating text', 'Votes']
+
+FLAG_COLUMNS = ['Has Table booking', 'Has Online delivery', 'Is delivering now', 'Switch to order menu']
+
+# Smallest spread, in degrees, of the restaurants around a city center
+MIN_CITY_SPREAD = 0.01
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def build_profile(df, cities_per_city = 1):
+
+    """ This function learns the distributions of the real dataset used by the generator
+
+        Operations:
+        1- Weights every city by its restaurants and keeps its country, currency and coordinates spread
+        2- Clones each city cities_per_city times with a shifted center, to raise the city cardinality
+        3- Keeps the localities, cuisines, names, price ranges, costs, ratings and votes to sample from
+        4- Maps each aggregate_rating to its most common rating color and text
+        5- Keeps the booking and delivery flag rates of every country
+
+        Input: Raw Dataframe, number of synthetic cities per real city
+        Output: Profile dictionary
+
+    """
+
+    cities = df.groupby(['Country Code', 'City']).agg(weight = ('Restaurant ID', 'size'),
+                                                      currency = ('Currency', lambda x: x.mode().iloc[0]),
+                                                      latitude = ('Latitude', 'median'),
+                                                      longitude = ('Longitude', 'median'),
+                                                      latitude_std = ('Latitude', 'std'),
+                                                      longitude_std = ('Longitude', 'std')).reset_index()
+    cities[['latitude_std', 'longitude_std']] = cities[['latitude_std', 'longitude_std']].fillna(0).clip(lower = MIN_CITY_SPREAD)
+    cities['source'] = cities['City']
+
+    if cities_per_city > 1:
+        clones = []
+        for i in range(cities_per_city):
+            clone = cities.copy()
+            if i > 0:
+                clone['City'] = clone['City'] + ' ' + str(i + 1)
+                clone['latitude'] = (clone['latitude'] + i * 4 * clone['latitude_std']).clip(-85, 85)
+            clones.append(clone)
+        cities = pd.concat(clones, ignore_index = True)
+
+    cuisine_lists = df['Cuisines'].dropna().str.split(',')
+    cuisines = cuisine_lists.explode().str.strip().value_counts(normalize = True)
+    ratings = df.groupby('Aggregate rating')[['Rating color', 'Rating text']].agg(lambda x: x.mode().iloc[0])
+
+    return {
+        'cities': cities,
+        'city_p': (cities['weight'] / cities['weight'].sum()).to_numpy(),
+        'localities': df.groupby('City')['Locality'].unique().to_dict(),
+        'names': df['Restaurant Name'].dropna().unique(),
+        'cuisines': cuisines.index.to_numpy(),
+        'cuisine_p': cuisines.to_numpy(),
+        'cuisine_counts': cuisine_lists.str.len().value_counts(normalize = True),
+        'missing_cuisines': df['Cuisines'].isna().mean(),
+        'prices': {key: group.to_numpy() for key, group in df.groupby('Country Code')['Price range']},
+        'costs': {key: group.to_numpy() for key, group in df.groupby(['Country Code', 'Price range'])['Average Cost for two']},
+        'ratings': df['Aggregate rating'].to_numpy(),
+        'rating_color': ratings['Rating color'].to_dict(),
+        'rating_text': ratings['Rating text'].to_dict(),
+        'votes': df.loc[df['Aggregate rating'] > 0, 'Votes'].to_numpy(),
+        'flags': df.groupby('Country Code')[FLAG_COLUMNS].mean(),
+    }
+
+
+
+
+
+def sample_by_group(rng, groups, pools):
+
+    """ This function samples one value per row from the pool of the row group
+
+        Operations:
+        1- Finds the rows of each group
+        2- Samples all of them at once from the group pool
+
+        Input: Random generator, group of each row, dictionary of pools by group
+        Output: Numpy array of sampled values
+
+    """
+
+    values = np.empty(len(groups), dtype = object)
+    codes, uniques = pd.factorize(groups)
+
+    for code, group in enumerate(uniques):
+        rows = np.flatnonzero(codes == code)
+        pool = pools[group]
+        values[rows] = pool[rng.integers(0, len(pool), len(rows))]
+
+    return values
+
+
+
+
+
+def cuisines_column(rng, profile, rows):
+
+    """ This function creates comma separated cuisine lists
+
+        Operations:
+        1- Samples how many cuisines each restaurant lists
+        2- Samples the cuisines with the real frequencies
+        3- Joins them column by column, so only max(count) vectorized passes are made
+        4- Leaves the same share of restaurants without cuisines as the real dataset
+
+        Input: Random generator, profile, number of rows
+        Output: Numpy array of cuisine lists
+
+    """
+
+    counts = profile['cuisine_counts']
+    count = rng.choice(counts.index.to_numpy(), size = rows, p = counts.to_numpy())
+    picked = profile['cuisines'][rng.choice(len(profile['cuisines']), size = (rows, count.max()), p = profile['cuisine_p'])]
+
+    cuisines = picked[:, 0].astype(object)
+    for j in range(1, count.max()):
+        cuisines = np.where(count > j, cuisines + ', ' + picked[:, j], cuisines)
+
+    cuisines[rng.random(rows) < profile['missing_cuisines']] = None
+
+    return cuisines
+
+
+
+
+
+def generate_chunk(rng, profile, rows, first_id):
+
+    """ This function generates a chunk of synthetic restaurants with the raw csv schema
+
+        Operations:
+        1- Samples the city of each restaurant and takes its country and currency
+        2- Spreads the coordinates around the city center
+        3- Samples names, localities, cuisines, price ranges, costs and flags
+        4- Samples the rating and derives the rating color and text from it
+        5- Samples votes, keeping zero votes for unrated restaurants
+
+        Input: Random generator, profile, number of rows, first restaurant id
+        Output: Dataframe
+
+    """
+
+    cities = profile['cities']
+    city = rng.choice(len(cities), size = rows, p = profile['city_p'])
+    country_code = cities['Country Code'].to_numpy()[city]
+    city_name = cities['City'].to_numpy()[city]
+    locality = sample_by_group(rng, cities['source'].to_numpy()[city], profile['localities'])
+    price_range = sample_by_group(rng, country_code, profile['prices']).astype(np.int64)
+    cost_groups = pd.Series(list(zip(country_code, price_range)), dtype = object)
+    costs = sample_by_group(rng, cost_groups.to_numpy(), profile['costs']).astype(np.int64)
+
+    rating = profile['ratings'][rng.integers(0, len(profile['ratings']), rows)]
+    votes = np.where(rating > 0, profile['votes'][rng.integers(0, len(profile['votes']), rows)], 0)
+    flags = profile['flags'].loc[country_code].to_numpy()
+
+    df = pd.DataFrame({
+        'Restaurant ID': np.arange(first_id, first_id + rows),
+        'Restaurant Name': profile['names'][rng.integers(0, len(profile['names']), rows)],
+        'Country Code': country_code,
+        'City': city_name,
+        'Address': rng.integers(1, 500, rows).astype(str).astype(object) + ', ' + locality + ', ' + city_name,
+        'Locality': locality,
+        'Locality Verbose': locality + ', ' + city_name,
+        'Longitude': cities['longitude'].to_numpy()[city] + rng.normal(0, 1, rows) * cities['longitude_std'].to_numpy()[city],
+        'Latitude': cities['latitude'].to_numpy()[city] + rng.normal(0, 1, rows) * cities['latitude_std'].to_numpy()[city],
+        'Cuisines': cuisines_column(rng, profile, rows),
+        'Average Cost for two': costs,
+        'Currency': cities['currency'].to_numpy()[city],
+        'Price range': price_range,
+        'Aggregate rating': rating,
+        'Rating color': pd.Series(rating).map(profile['rating_color']).to_numpy(),
+        'Rating text': pd.Series(rating).map(profile['rating_text']).to_numpy(),
+        'Votes': votes,
+    })
+
+    for i, col in enumerate(FLAG_COLUMNS):
+        df[col] = (rng.random(rows) < flags[:, i]).astype(np.int64)
+
+    return df[COLUMNS]
+
+
+
+
+
+def generate_chunks(rows, chunk_size = DEFAULT_CHUNK_SIZE, seed = 0, cities_per_city = 1, source = DATASET_PATH):
+
+    """ This function streams a synthetic dataset in chunks
+
+        Input: Number of rows, rows per chunk, random seed, synthetic cities per real city, real dataset path
+        Output: Generator of Dataframes
+
+    """
+
+    profile = build_profile(pd.read_csv(source), cities_per_city)
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, rows, chunk_size):
+        yield generate_chunk(rng, profile, min(chunk_size, rows - start), start + 1)
+
+
+
+
+
+def write_dataset(path, rows, chunk_size = DEFAULT_CHUNK_SIZE, seed = 0, cities_per_city = 1):
+
+    """ This function writes a synthetic dataset chunk by chunk
+
+        Operations:
+        1- Writes csv for a .csv path, appending each chunk after the header
+        2- Writes an Arrow IPC (feather) file for any other extension, one record batch per chunk
+
+        Input: Output path, number of rows, rows per chunk, random seed, synthetic cities per real city
+        Output: Output path
+
+    """
+
+    chunks = generate_chunks(rows, chunk_size, seed, cities_per_city)
+
+    if os.path.splitext(path)[1].lower() == '.csv':
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(path, mode = 'w' if i == 0 else 'a', header = i == 0, index = False)
+        return path
+
+    import pyarrow as pa
+
+    writer = None
+    schema = None
+
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema = schema, preserve_index = False)
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(path, schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return path
+
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Writes a synthetic Zomato-shaped dataset')
+    parser.add_argument('output', help = '.csv or .feather path')
+    parser.add_argument('--rows', type = int, required = True)
+    parser.add_argument('--chunk-size', type = int, default = DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--cities-per-city', type = int, default = 1)
+    args = parser.parse_args()
+
+    print(write_dataset(args.output, args.rows, args.chunk_size, args.seed, args.cities_per_city))
@@ -1,172 +1,95 @@
-import pandas as pd
-import inflection
-import plotly.express as px
-import folium
 import streamlit as st
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium, folium_static
-from PIL import Image
+from utils.logo import sidebar_logo
+from utils.instrumentation import begin_rerun, end_rerun, timed
+from utils.data_loader import sidebar_countries
+from utils.cities import city_rankings, rating_band, top_cities
+from utils.figure_cache import cached_figure
+from utils.parallel import submit_jobs
+from utils.sketches import APPROXIMATE, APPROXIMATE_HELP, ERROR_BOUND
 
 
 st.set_page_config(page_title = 'Cities', page_icon = '🌃', layout = 'wide')
+begin_rerun('cities')
 
 #===============================================================================================
 # Functions
 #===============================================================================================
 
 
-def rating_comparison_over(df1):
+def cities_chart(ranking, column):
     
-    """ This function exhibits the top cities with the highest aggregate_rating count above 4
+    """ This function exhibits the top cities of a ranking
         
         Operations:
-        1- Selects all aggregate_rating above 4
-        2- Groups by city and make a count
-        3- Sort the restaurant_id values from highest to lowest
-        4- Reset the index
-        5- Exhibits the top cities based on the top_cities_slider slider
-        6- Creates a bar chart with the 'city' and 'restaurant_id' values
-        
-        Input: Dataframe
+        1- Selects the top cities based on the top_cities_slider slider
+        2- Creates a bar chart with the 'city' and column values
+        
+        Input: Ranking Series, value column name
         Output: Bar chart
         
     """
 
-    df1_aux = df1['aggregate_rating'] > 4
-    aux = df1.loc[df1_aux, ['city', 'restaurant_id']].groupby('city').count().sort_values('restaurant_id', ascending = False).reset_index().loc[0 : top_cities_slider, :]
-    graph = px.bar(aux, x = 'city', y = 'restaurant_id')
+    import plotly.express as px
+
+    aux = top_cities(ranking, top_cities_slider, column)
+    graph = px.bar(aux, x = 'city', y = column)
 
     return graph
 
 
 
-def rating_comparison_under(df1):
-        
-    """ This function exhibits the top cities with the highest aggregate_rating count below 2.5
+def rating_comparison_over(rankings):
+    
+    """ This function exhibits the top cities with the highest aggregate_rating count above the rating_over_slider value
         
         Operations:
-        1- Selects all aggregate_rating below 2.5
-        2- Groups by city nad make a count
-        3- Sort the restaurant_id values from highest to lowest
-        4- Reset the index
-        5- Exhibits the top cities based on the top_cities_slider slider
-        6- Creates a bar chart with the 'city' and 'restaurant_id' values
-        
-        Input: Dataframe
+        1- Counts the restaurants rated above rating_over_slider of each city from the rating histogram
+        2- Selects the top cities based on the top_cities_slider slider
+        3- Creates a bar chart with the 'city' and 'restaurant_id' values
+        
+        Input: City rankings
         Output: Bar chart
         
     """
 
-    df1_aux = df1['aggregate_rating'] < 2.5
-    aux = df1.loc[df1_aux, ['city', 'restaurant_id']].groupby('city').count().sort_values('restaurant_id', ascending = False).reset_index().loc[0 : top_cities_slider, :]
+    import plotly.express as px
+
+    aux = top_cities(rating_band(rankings['rating_histogram'], rating_over_slider, over = True), top_cities_slider, 'restaurant_id')
     graph = px.bar(aux, x = 'city', y = 'restaurant_id')
 
     return graph
 
 
 
-def country_name(country_id):
- 
-
-    """ This function creates a dictionary wich contains the corresponding country_id value
+def rating_comparison_under(rankings):
         
-        Operations:
-        1- Creates dictionary
+    """ This function exhibits the top cities with the highest aggregate_rating count below the rating_under_slider value
         
-        Input: Dataframe
-        Output: Country Name
+        Operations:
+        1- Counts the restaurants rated below rating_under_slider of each city from the rating histogram
+        2- Selects the top cities based on the top_cities_slider slider
+        3- Creates a bar chart with the 'city' and 'restaurant_id' values
         
-    """
-    
-    Countries = {
-        1: 'India',
-        14: 'Australia',
-        30: 'Brazil',
-        37: 'Canada',
-        94: 'Indonesia',
-        148: 'New Zeland',
-        162: 'Philippines',
-        166: 'Qatar',
-        184: 'Singapure',
-        189: 'South Africa',
-        191: 'Sri Lanka',
-        208: 'Turkey',
-        214: 'United Arab Emirates',
-        215: 'England',
-        216: 'United States of America',
-}
-
-    return Countries[country_id]
-
-
-
-
-def rename_columns(df):
-    
-    
-    """ This function cleans the dataset
-        
-        Types of cleaning:
-        1- Make a copy of the dataframe
-        2- Creates a variable named "title" to capitalize all the words and replace some characters in the string
-        3- Creates a variable named "snakecase" to make an underscored, lowercase form from the expression
-        4- Creates a variable named "space" to remove blank spaces
-        5- Creates a list containing the columns names
-        6- Apply the variable named "title" to edit the column's names
-        7- Apply the variable named "spaces" to edit the column's names
-        8- Apply the variable named "snakecase" to edit the column's names
-        9- Replaces the column's names with the edited column's name
-        10- Split the cuisines columns values and select the first value
-        11- Drop duplicates
-        12- Delete the switch_to_order_menu column
-        13- Reset the index
-        
-        Input: Dataframe
-        Output: Dataframe
+        Input: City rankings
+        Output: Bar chart
         
     """
-    
-    
-    df1 = df.copy()
-    title = lambda x: inflection.titleize(x)
-    snakecase = lambda x: inflection.underscore(x)
-    spaces = lambda x: x.replace(" ", "")
-    cols_old = list(df.columns)
-    cols_old = list(map(title, cols_old))
-    cols_old = list(map(spaces, cols_old))
-    cols_new = list(map(snakecase, cols_old))
-    df1.columns = cols_new 
-    df1['cuisines'] = df1.loc[:, 'cuisines'].astype(str).apply(lambda x: x.split(',')[0])
-    df1 = df1.drop_duplicates(keep = 'first')
-    del df1['switch_to_order_menu']
-    df1 = df1.reset_index(drop = True)
-    
-    return df1
-
-
-
-
-
-#===============================================================================================
-# Import Dataset
-#===============================================================================================
 
-df = pd.read_csv('dataset/zomato.csv')
+    import plotly.express as px
 
+    aux = top_cities(rating_band(rankings['rating_histogram'], rating_under_slider, over = False), top_cities_slider, 'restaurant_id')
+    graph = px.bar(aux, x = 'city', y = 'restaurant_id')
 
+    return graph
 
-#===============================================================================================
-# Cleaning Dataset
-#===============================================================================================
 
-df1 = rename_columns(df)
 
 #===============================================================================================
-# Adding country column
+# Import Dataset
 #===============================================================================================
 
-
-df1['country'] = df1['country_code'].apply(country_name)
+with timed('dataset_load'):
+    countries = sidebar_countries()
 
 
 #===============================================================================================
@@ -175,9 +98,7 @@ df1['country'] = df1['country_code'].apply(country_name)
 
 st.sidebar.markdown("""---""")
 
-image_path = 'imagem_fome_zero.png'
-image = Image.open(image_path)
-st.sidebar.image(image, width = 100)
+st.sidebar.image(sidebar_logo(), width = 100)
 
 st.sidebar.markdown('# Fome Zero')
 
@@ -187,31 +108,51 @@ st.sidebar.markdown("""---""")
 
 # Countries selection
 
-country_select = st.sidebar.multiselect('Select the countries: ', ['Philippines', 'Brazil', 'Australia', 'United States of America', 'Canada', 'Singapure', 'United Arab Emirates', 'India', 'Indonesia', 'New Zeland', 'England', 'Qatar', 'South Africa', 'Sri Lanka', 'Turkey'], default = ['Philippines', 'Brazil', 'Australia', 'United States of America', 'Canada', 'Singapure', 'United Arab Emirates', 'India', 'Indonesia', 'New Zeland', 'England', 'Qatar', 'South Africa', 'Sri Lanka', 'Turkey'])
+country_select = st.sidebar.multiselect('Select the countries: ', countries, default = countries)
 
-countries_selection = df1['country'].isin(country_select)
-df1 = df1.loc[countries_selection, :].reset_index()
+with timed('sidebar_filter'):
+    rankings = city_rankings(country_select)
 
 
 
 # Top amount select
 
-top_cities_slider = (st.sidebar.slider('How many cities?', min_value = 0, max_value = 100) -1)
+top_cities_slider = st.sidebar.slider('How many cities?', min_value = 0, max_value = 100)
+
+
+
+# Rating thresholds
+
+rating_over_slider = st.sidebar.slider('Rating above: ', min_value = 0.0, max_value = 5.0, value = 4.0, step = 0.1)
+rating_under_slider = st.sidebar.slider('Rating below: ', min_value = 0.0, max_value = 5.0, value = 2.5, step = 0.1)
+
+# Each chart is keyed only on the filters it depends on, so moving a rating slider keeps the other charts
+filters = {'countries': country_select, 'top_cities': top_cities_slider}
+filters_over = dict(filters, rating_over = rating_over_slider)
+filters_under = dict(filters, rating_under = rating_under_slider)
 
 
 # ==============================================================================================
 # Streamlit Layout
 # ==============================================================================================
 
+# Chart jobs are rendered below in the layout order
+jobs = submit_jobs({
+    'chart:restaurants': lambda: cached_figure('cities', 'restaurants', filters, lambda: cities_chart(rankings['restaurants'], 'restaurant_id')),
+    'chart:rating_over': lambda: cached_figure('cities', 'rating_over', filters_over, lambda: rating_comparison_over(rankings)),
+    'chart:rating_under': lambda: cached_figure('cities', 'rating_under', filters_under, lambda: rating_comparison_under(rankings)),
+    'chart:cuisines': lambda: cached_figure('cities', 'cuisines', filters, lambda: cities_chart(rankings['cuisines'], 'cuisines')),
+})
 
 with st.container():
     
     # Top cities with most restaurants registrered
     st.markdown('### Top cities with most restaurants registrered')
     
-    aux = df1.loc[:, ['city', 'restaurant_id']].groupby('city').count().sort_values(['restaurant_id', ], ascending = False).reset_index().loc[0 : top_cities_slider, :]
-    graph = px.bar(aux, x = 'city', y = 'restaurant_id')
-    st.plotly_chart(graph, use_container_width = True)
+    graph = jobs['chart:restaurants'].result()
+    
+    with timed('render:restaurants'):
+        st.plotly_chart(graph, use_container_width = True)
     
     st.markdown("""---""")
     
@@ -221,19 +162,23 @@ with st.container():
     
     with col1:
         
-        # Top cities with over 4 Rating
-        st.markdown('#### Top cities with over 4 Rating')
+        # Top cities with over rating_over_slider Rating
+        st.markdown('#### Top cities with over {:g} Rating'.format(rating_over_slider))
         
-        graph = rating_comparison_over(df1)
-        st.plotly_chart(graph, use_container_width = True)
+        graph = jobs['chart:rating_over'].result()
+        
+        with timed('render:rating_over'):
+            st.plotly_chart(graph, use_container_width = True)
 
     with col2:
         
-        # Top cities with under 2.5 Rating
-        st.markdown('#### Top cities with under 2.5 Rating')
+        # Top cities with under rating_under_slider Rating
+        st.markdown('#### Top cities with under {:g} Rating'.format(rating_under_slider))
         
-        graph = rating_comparison_under(df1)
-        st.plotly_chart(graph, use_container_width = True)
+        graph = jobs['chart:rating_under'].result()
+        
+        with timed('render:rating_under'):
+            st.plotly_chart(graph, use_container_width = True)
         
     st.markdown("""---""")
     
@@ -242,6 +187,12 @@ with st.container():
     # Top cities with the greatest variety of cuisines
     st.markdown('### Top cities with the greatest variety of cuisines')
     
-    aux = df1.loc[:, ['city', 'cuisines']].groupby('city').nunique().sort_values('cuisines', ascending = False).reset_index().loc[0 : top_cities_slider, :]
-    graph = px.bar(aux, x = 'city', y = 'cuisines')
-    st.plotly_chart(graph, use_container_width = True)
+    if APPROXIMATE:
+        st.caption(APPROXIMATE_HELP.format(ERROR_BOUND))
+    
+    graph = jobs['chart:cuisines'].result()
+    
+    with timed('render:cuisines'):
+        st.plotly_chart(graph, use_container_width = True)
+
+end_rerun()
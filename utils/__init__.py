@@ -0,0 +1 @@
+""" Shared helpers used by the Fome Zero dashboard pages """
@@ -0,0 +1,410 @@
+""" Headless JSON API with the dashboard metrics
+
+    Serves the numbers of the Countries, Cities and Cuisines pages from the same cached dataset and
+    aggregates, taking the sidebar filters as query parameters. A list filter repeats the parameter or
+    separates its values with commas, and a missing list selects every option, as the sidebar does.
+    Responses are cached per dataset version and filters and carry an ETag built from the same key,
+    so a client sending a matching If-None-Match gets a 304 before any body is looked up or built.
+
+    Endpoints:
+        GET /countries              countries of the sidebar
+        GET /cuisines               cuisines of the sidebar
+        GET /countries/summary      ?countries=
+        GET /cities/top             ?countries= &top=10 &rating_over=4.0 &rating_under=2.5
+        GET /cuisines/top           ?countries= &cuisines= &top=10 &top_cuisines=100
+
+    Usage:
+        python -m utils.api [--host 127.0.0.1] [--port 8502] [--csv dataset/zomato.csv]
+
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.data_loader import DATASET_PATH, dataset_version, sidebar_countries
+from utils.countries import country_cube, select_countries, top_country
+from utils.cities import city_rankings, rating_band, top_cities
+from utils.cuisines import cuisine_summary, selection_top_restaurants, sidebar_cuisines, top_cuisines
+from utils.figure_cache import normalize_filters
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+
+# Memory cap of the cached responses, measured as the size of their JSON body
+MAX_CACHE_BYTES = int(float(os.environ.get('FOME_ZERO_API_CACHE_MB', '16')) * 2 ** 20)
+
+# Defaults of the filters that are sliders on the pages
+DEFAULT_TOP = 10
+DEFAULT_TOP_CUISINES = 100
+DEFAULT_RATING_OVER = 4.0
+DEFAULT_RATING_UNDER = 2.5
+
+# Metrics of the Countries page: {name: country cube column}
+COUNTRY_METRICS = {'most_cities': 'city', 'most_voted': 'votes', 'most_cuisines': 'cuisines', 'biggest_rating_mean': 'aggregate_rating'}
+COUNTRY_COLUMNS = ['city', 'restaurant_id', 'votes', 'aggregate_rating', 'cuisines']
+
+# Query parameters read by each endpoint, and the ones that are lists
+ENDPOINT_PARAMS = {
+    '/countries': [],
+    '/cuisines': [],
+    '/countries/summary': ['countries'],
+    '/cities/top': ['countries', 'top', 'rating_over', 'rating_under'],
+    '/cuisines/top': ['countries', 'cuisines', 'top', 'top_cuisines'],
+}
+LIST_PARAMS = {'countries', 'cuisines'}
+
+# Process-wide LRU shared by every request thread: {key: body}
+_RESPONSE_CACHE = OrderedDict()
+_RESPONSE_LOCK = threading.Lock()
+_cache_bytes = 0
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def list_param(query, name, options):
+
+    """ This function reads a list filter from the query parameters
+
+        Operations:
+        1- Splits every value of the parameter on commas, so repeated and comma separated values both work
+        2- Selects every option when the parameter is missing, like the default of the sidebar
+
+        Input: Parsed query, parameter name, list of options
+        Output: List of selected values
+
+    """
+
+    if name not in query:
+        return list(options)
+
+    return [value for raw in query[name] for value in raw.split(',') if value]
+
+
+
+
+
+def number_param(query, name, default, cast = int):
+
+    """ This function reads a numeric filter from the query parameters
+
+        Input: Parsed query, parameter name, default value, type
+        Output: Value (raises ValueError when it is not a number)
+
+    """
+
+    if not query.get(name):
+        return default
+
+    try:
+        return cast(query[name][-1])
+    except ValueError:
+        raise ValueError('{} must be a number, got {!r}'.format(name, query[name][-1]))
+
+
+
+
+
+def records(df):
+
+    """ This function turns a table into JSON records, with missing values as null
+
+        Input: Dataframe
+        Output: List of dictionaries
+
+    """
+
+    return json.loads(df.to_json(orient = 'records', double_precision = 15))
+
+
+
+
+
+def countries_summary(query, path = DATASET_PATH):
+
+    """ This function answers the Countries page
+
+        Operations:
+        1- Selects the countries from the country cube
+        2- Finds the country with the highest value of each metric, or null without countries
+        3- Lists the cube values of each selected country
+
+        Input: Parsed query, dataset path
+        Output: Dictionary
+
+    """
+
+    countries = list_param(query, 'countries', sidebar_countries(path))
+    cube = select_countries(country_cube(path), countries)
+
+    metrics = {name: top_country(cube, column) if len(cube) else None for name, column in COUNTRY_METRICS.items()}
+
+    return {'filters': {'countries': countries}, 'metrics': metrics, 'countries': records(cube[COUNTRY_COLUMNS].reset_index())}
+
+
+
+
+
+def cities_top(query, path = DATASET_PATH):
+
+    """ This function answers the Cities page
+
+        Operations:
+        1- Takes the city rankings of the selected countries
+        2- Counts the restaurants rated above rating_over and below rating_under from the rating histogram
+        3- Selects the top cities of each ranking
+
+        Input: Parsed query, dataset path
+        Output: Dictionary
+
+    """
+
+    countries = list_param(query, 'countries', sidebar_countries(path))
+    top = number_param(query, 'top', DEFAULT_TOP)
+    rating_over = number_param(query, 'rating_over', DEFAULT_RATING_OVER, float)
+    rating_under = number_param(query, 'rating_under', DEFAULT_RATING_UNDER, float)
+
+    rankings = city_rankings(countries, path)
+
+    return {
+        'filters': {'countries': countries, 'top': top, 'rating_over': rating_over, 'rating_under': rating_under},
+        'restaurants': records(top_cities(rankings['restaurants'], top, 'restaurant_id')),
+        'rating_over': records(top_cities(rating_band(rankings['rating_histogram'], rating_over, over = True), top, 'restaurant_id')),
+        'rating_under': records(top_cities(rating_band(rankings['rating_histogram'], rating_under, over = False), top, 'restaurant_id')),
+        'cuisines': records(top_cities(rankings['cuisines'], top, 'cuisines')),
+    }
+
+
+
+
+
+def cuisines_top(query, path = DATASET_PATH):
+
+    """ This function answers the Cuisines page
+
+        Operations:
+        1- Selects the top restaurants of the selected countries and cuisines
+        2- Slices the best and worst cuisine types from the cuisine summary of the selection
+
+        Input: Parsed query, dataset path
+        Output: Dictionary
+
+    """
+
+    countries = list_param(query, 'countries', sidebar_countries(path))
+    cuisines = list_param(query, 'cuisines', sidebar_cuisines(path))
+    top = number_param(query, 'top', DEFAULT_TOP)
+    top_n = number_param(query, 'top_cuisines', DEFAULT_TOP_CUISINES)
+
+    summary = cuisine_summary(countries, cuisines, path)
+
+    return {
+        'filters': {'countries': countries, 'cuisines': cuisines, 'top': top, 'top_cuisines': top_n},
+        'top_restaurants': records(selection_top_restaurants(countries, cuisines, top, path)),
+        'best_cuisines': records(top_cuisines(summary, ascending = False, top_n = top_n)),
+        'worst_cuisines': records(top_cuisines(summary, ascending = True, top_n = top_n)),
+    }
+
+
+
+
+
+ENDPOINTS = {
+    '/countries': lambda query, path: {'countries': sidebar_countries(path)},
+    '/cuisines': lambda query, path: {'cuisines': sidebar_cuisines(path)},
+    '/countries/summary': countries_summary,
+    '/cities/top': cities_top,
+    '/cuisines/top': cuisines_top,
+}
+
+
+
+
+
+def response_key(route, query, path = DATASET_PATH):
+
+    """ This function builds the cache key of a response from the query parameters the endpoint reads
+
+        Operations:
+        1- Keeps only the parameters of the endpoint, so unknown ones do not split the cache
+        2- Takes the values of a list filter as list_param does, ignoring their order and duplicates
+        3- Takes the last value of a numeric filter, the one number_param reads
+
+        Input: Endpoint path, parsed query, dataset path
+        Output: Tuple with the dataset version, endpoint and normalized filters
+
+    """
+
+    filters = {}
+
+    for name in ENDPOINT_PARAMS[route]:
+        if name in LIST_PARAMS and name in query:
+            filters[name] = [value for raw in query[name] for value in raw.split(',') if value]
+        elif query.get(name):
+            filters[name] = query[name][-1]
+
+    return (dataset_version(path), route, normalize_filters(filters))
+
+
+
+
+
+def response_etag(key):
+
+    """ This function builds the ETag of a response from its cache key
+
+        Input: Tuple with the dataset version, endpoint and normalized query
+        Output: Quoted ETag
+
+    """
+
+    return '"{}"'.format(hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:24])
+
+
+
+
+
+def cached_response(key, route, query, path = DATASET_PATH):
+
+    """ This function returns the JSON body of an endpoint, computing it only once per dataset version and query
+
+        Operations:
+        1- Returns the cached body when another request already computed it
+        2- Otherwise answers the endpoint, encodes the body and stores it
+        3- Evicts the least recently used responses while the cache is above MAX_CACHE_BYTES
+
+        Input: Response key, endpoint path, parsed query, dataset path
+        Output: Body bytes
+
+    """
+
+    global _cache_bytes
+
+    with _RESPONSE_LOCK:
+        body = _RESPONSE_CACHE.get(key)
+        if body is not None:
+            _RESPONSE_CACHE.move_to_end(key)
+            return body
+
+    body = json.dumps(ENDPOINTS[route](query, path), default = lambda x: x.item() if hasattr(x, 'item') else str(x)).encode('utf-8')
+
+    with _RESPONSE_LOCK:
+
+        if key not in _RESPONSE_CACHE and len(body) <= MAX_CACHE_BYTES:
+            _RESPONSE_CACHE[key] = body
+            _cache_bytes += len(body)
+
+        while _cache_bytes > MAX_CACHE_BYTES:
+            _, evicted = _RESPONSE_CACHE.popitem(last = False)
+            _cache_bytes -= len(evicted)
+
+    return body
+
+
+
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+
+    """ Request handler of the API, answering GET requests from cached_response """
+
+    csv_path = DATASET_PATH
+
+    def do_GET(self):
+
+        url = urlsplit(self.path)
+        route = url.path.rstrip('/') or '/'
+
+        if route not in ENDPOINTS:
+            return self.send_json(404, {'error': 'unknown endpoint {}'.format(route), 'endpoints': sorted(ENDPOINTS)})
+
+        query = parse_qs(url.query, keep_blank_values = True)
+        key = response_key(route, query, self.csv_path)
+        etag = response_etag(key)
+
+        # The ETag only depends on the key, so a revalidation is answered before the body is looked up or built
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        try:
+            body = cached_response(key, route, query, self.csv_path)
+        except ValueError as error:
+            return self.send_json(400, {'error': str(error)})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+
+        body = json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+
+
+
+def serve(host = DEFAULT_HOST, port = DEFAULT_PORT, path = DATASET_PATH):
+
+    """ This function serves the API until interrupted
+
+        Operations:
+        1- Answers each request on its own thread, sharing the dataset, aggregate and response caches
+        2- Reads the dataset given by path
+
+        Input: Host, port, dataset path
+        Output: None
+
+    """
+
+    handler = type('ApiHandler', (ApiHandler,), {'csv_path': path})
+    server = ThreadingHTTPServer((host, port), handler)
+
+    print('Serving the Fome Zero API on http://{}:{}'.format(host, server.server_address[1]), file = sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Serves the dashboard metrics as JSON')
+    parser.add_argument('--host', default = DEFAULT_HOST)
+    parser.add_argument('--port', type = int, default = DEFAULT_PORT)
+    parser.add_argument('--csv', default = DATASET_PATH)
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.csv)
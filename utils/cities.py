@@ -0,0 +1,155 @@
+import numpy as np
+
+from utils.data_loader import DATASET_PATH, SQL_BACKEND, dataset_artifact, selection_artifact
+from utils.cuisines import restaurant_cuisines
+from utils.filters import filter_dataset
+from utils.sketches import APPROXIMATE, approximate_city_cuisines
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Width of the aggregate_rating bins, the precision of the ratings in the dataset
+RATING_BIN = 0.1
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def build_rating_histogram(df1):
+
+    """ This function counts the restaurants of each city in fixed aggregate_rating bins
+
+        Operations:
+        1- Rounds each aggregate_rating to its RATING_BIN wide bin
+        2- Counts the restaurants of each country, city and bin in a single groupby
+        3- Names the bins by the rating they hold, so thresholds compare directly with the columns
+
+        Input: Cleaned Dataframe
+        Output: Dataframe indexed by (country, city), with one column per rating bin
+
+    """
+
+    bins = np.rint(df1['aggregate_rating'].to_numpy(np.float64) / RATING_BIN)
+    aux = df1[['country', 'city']].assign(rating_bin = bins).dropna()
+    histogram = aux.groupby(['country', 'city', 'rating_bin'], observed = True).size().unstack(fill_value = 0)
+    histogram.columns = np.round(histogram.columns * RATING_BIN, 1)
+
+    return histogram
+
+
+
+
+
+def rating_histogram(path = DATASET_PATH):
+
+    """ This function returns the per city rating histogram, built once per dataset version
+
+        Input: Dataset path
+        Output: Dataframe indexed by (country, city), with one column per rating bin
+
+    """
+
+    return dataset_artifact('rating_histogram', build_rating_histogram, path)
+
+
+
+
+
+def rating_band(histogram, threshold, over = True):
+
+    """ This function counts the restaurants of each city rated above or below a threshold
+
+        Operations:
+        1- Selects the bins above the threshold (over) or below it (not over)
+        2- Sums them for each city
+        3- Keeps the cities with at least one restaurant in the band
+
+        Input: City rating histogram, rating threshold, over (True or False)
+        Output: Series indexed by city
+
+    """
+
+    bins = histogram.columns > threshold if over else histogram.columns < threshold
+    counts = histogram.loc[:, bins].sum(axis = 1)
+
+    return counts[counts > 0]
+
+
+
+
+
+def build_city_rankings(country_select, path = DATASET_PATH):
+
+    """ This function counts, once per country selection, every per city value ranked on the Cities page
+
+        Operations:
+        1- Takes the restaurants of the selected countries from the shared filtered view
+        2- Counts the restaurants of each city
+        3- Merges the rating histograms of the selected countries by city, so any rating band
+           is answered with rating_band without scanning the restaurants
+        4- Counts the distinct listed cuisines of each city, or merges their sketches in the approximate mode
+
+        Input: List of selected countries, dataset path
+        Output: Dictionary of Series indexed by city and the city rating histogram
+
+    """
+
+    df1 = filter_dataset(country_select, path = path)
+    city_groups = lambda x: x.groupby('city', observed = True)
+    histogram = rating_histogram(path)
+    histogram = histogram.loc[histogram.index.get_level_values('country').isin(country_select), :]
+
+    rankings = {
+        'restaurants': city_groups(df1)['restaurant_id'].count(),
+        'rating_histogram': histogram.groupby(level = 'city', observed = True).sum(),
+    }
+
+    if APPROXIMATE:
+        rankings['cuisines'] = approximate_city_cuisines(country_select, path)
+    else:
+        rankings['cuisines'] = city_groups(restaurant_cuisines(df1, ['city'], path))['cuisines'].nunique()
+
+    return rankings
+
+
+
+
+
+def city_rankings(country_select, path = DATASET_PATH):
+
+    """ This function returns the city rankings of a country selection, built once per selection and dataset version
+        and kept among the most recently used selections
+
+        Input: List of selected countries, dataset path
+        Output: Dictionary of Series indexed by city and the city rating histogram, queried from the database with the SQL backend
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_city_rankings
+        return sql_city_rankings(country_select, path)
+
+    return selection_artifact('city_rankings', frozenset(country_select), lambda: build_city_rankings(country_select, path), path)
+
+
+
+
+
+def top_cities(ranking, top_n, column):
+
+    """ This function selects the top_n cities of a ranking
+
+        Operations:
+        1- Selects the top_n largest values without sorting the whole ranking
+        2- Moves the cities to a column named city and the values to the given column
+
+        Input: Ranking Series, number of cities, value column name
+        Output: Dataframe
+
+    """
+
+    return ranking.nlargest(max(top_n, 0)).rename(column).rename_axis('city').reset_index()
@@ -0,0 +1,87 @@
+from utils.data_loader import DATASET_PATH, SQL_BACKEND, dataset_artifact
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def build_country_cube(df1):
+
+    """ This function aggregates the dataset once per country
+
+        Operations:
+        1- Groups the dataset by country in a single pass
+        2- Counts the distinct cities and primary cuisines and the registered restaurants
+        3- Sums the votes and the aggregate_rating, counts the ratings and takes their mean
+        4- Keeps the set of primary cuisines of each country, so selections can merge them
+        5- Sorts the countries by name, as groupby('country') did over the text column, so the charts
+           and metrics break ties between countries as before
+
+        Input: Cleaned Dataframe
+        Output: Dataframe indexed by country, sorted by name
+
+    """
+
+    cube = df1.groupby('country', observed = True).agg(city = ('city', 'nunique'),
+                                                       restaurant_id = ('restaurant_id', 'count'),
+                                                       votes = ('votes', 'sum'),
+                                                       aggregate_rating = ('aggregate_rating', 'mean'),
+                                                       rating_sum = ('aggregate_rating', 'sum'),
+                                                       rating_count = ('aggregate_rating', 'count'),
+                                                       cuisines = ('cuisines', 'nunique'))
+    cube['cuisine_set'] = df1.groupby('country', observed = True)['cuisines'].agg(lambda x: frozenset(x.dropna()))
+
+    return cube.sort_index(key = lambda index: index.astype(str))
+
+
+
+
+
+def country_cube(path = DATASET_PATH):
+
+    """ This function returns the per country aggregates, built once per dataset version
+
+        Input: Dataset path
+        Output: Dataframe indexed by country, queried from the database with the SQL backend
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_country_cube
+        return sql_country_cube(path)
+
+    return dataset_artifact('country_cube', build_country_cube, path)
+
+
+
+
+
+def select_countries(cube, country_select):
+
+    """ This function keeps the rows of the selected countries
+
+        Input: Country cube, list of selected countries
+        Output: Country cube
+
+    """
+
+    return cube.loc[cube.index.isin(country_select), :]
+
+
+
+
+
+def top_country(cube, column):
+
+    """ This function finds the country with the highest value of a country cube column
+
+        Operations:
+        1- Sorts the column from highest to lowest over the cube sorted by country name, with the default
+           sort of sort_values, so ties go to the same country as before
+
+        Input: Country cube, column name
+        Output: Country name
+
+    """
+
+    return cube[[column]].sort_values(column, ascending = False).reset_index().iloc[0,0]
@@ -0,0 +1,331 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH, SQL_BACKEND, dataset_artifact, load_dataset, selection_artifact
+from utils.filters import filter_dataset
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def build_cuisine_index(df1):
+
+    """ This function builds the restaurant to cuisine index of the dataset
+
+        Operations:
+        1- Factorizes the all_cuisines column, so each distinct list is split only once
+        2- Explodes the distinct lists into one row per listed cuisine
+        3- Joins the rows of the dataset with their exploded list
+        4- Drops cuisines listed twice for the same restaurant
+
+        Input: Cleaned Dataframe
+        Output: Dataframe with the restaurant row position (int32) and the cuisine (category codes)
+
+    """
+
+    codes, uniques = pd.factorize(df1['all_cuisines'])
+    exploded = pd.Series(uniques, dtype = object).str.split(',').explode().str.strip()
+    exploded = pd.DataFrame({'list': exploded.index.to_numpy(), 'cuisines': exploded.to_numpy()})
+
+    rows = np.flatnonzero(codes != -1)
+    index = pd.DataFrame({'restaurant': rows.astype(np.int32), 'list': codes[rows]})
+    index = index.merge(exploded, on = 'list', how = 'inner')[['restaurant', 'cuisines']]
+    index = index.drop_duplicates().sort_values('restaurant', kind = 'stable').reset_index(drop = True)
+    index['cuisines'] = index['cuisines'].astype('category')
+
+    return index
+
+
+
+
+
+def cuisine_index(path = DATASET_PATH):
+
+    """ This function returns the restaurant to cuisine index, built once per dataset version
+
+        Input: Dataset path
+        Output: Dataframe with the restaurant row position and the cuisine
+
+    """
+
+    return dataset_artifact('cuisine_index', build_cuisine_index, path)
+
+
+
+
+
+def restaurant_cuisines(df1, columns, path = DATASET_PATH):
+
+    """ This function lists every cuisine of the restaurants of a filtered dataset
+
+        Operations:
+        1- Reads the original row positions kept in the 'index' column by the page filters
+        2- Selects the cuisine index rows of those restaurants
+        3- Adds the requested columns of each restaurant
+
+        Input: Filtered Dataframe, list of columns
+        Output: Dataframe with one row per restaurant and cuisine
+
+    """
+
+    index = cuisine_index(path)
+    restaurants = index['restaurant'].to_numpy()
+    positions = df1['index'].to_numpy() if 'index' in df1.columns else np.arange(len(df1))
+
+    lookup = np.full(max(restaurants.max(initial = -1), positions.max(initial = -1)) + 1, -1)
+    lookup[positions] = np.arange(len(positions))
+    rows = lookup[restaurants]
+    selected = rows != -1
+
+    aux = df1[columns].iloc[rows[selected]].reset_index(drop = True)
+    aux['cuisines'] = index['cuisines'].values[selected]
+
+    return aux
+
+
+
+
+
+def cuisine_options(df1):
+
+    """ This function lists the primary cuisines offered on the sidebar cuisine selection
+
+        Input: Dataframe
+        Output: List of cuisines in order of appearance
+
+    """
+
+    return list(df1['cuisines'].dropna().unique())
+
+
+
+
+
+def sidebar_cuisines(path = DATASET_PATH):
+
+    """ This function lists the primary cuisines of the sidebar selection
+
+        Operations:
+        1- Queries the database with the SQL backend, so the page does not load the dataset
+        2- Otherwise lists them from the cached dataset with cuisine_options
+
+        Input: Dataset path
+        Output: List of cuisines in order of appearance
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_cuisine_options
+        return sql_cuisine_options(path)
+
+    return cuisine_options(load_dataset(path))
+
+
+
+
+
+def build_cuisine_summary(df1, cuisines_select, path = DATASET_PATH):
+
+    """ This function summarizes the ratings of every selected cuisine in a single grouped pass
+
+        Operations:
+        1- Lists every cuisine of each restaurant and keeps the selected ones, except Others
+        2- Groups cuisine types once, summing and counting the aggregate_rating
+        3- Takes the average aggregate_rating from the sum and count
+
+        Input: Filtered Dataframe, list of selected cuisines, dataset path
+        Output: Dataframe indexed by cuisine with rating_sum, rating_count and aggregate_rating
+
+    """
+
+    aux = restaurant_cuisines(df1, ['aggregate_rating'], path)
+    df1_aux = aux['cuisines'].isin(cuisines_select) & (aux['cuisines'] != 'Others')
+    summary = aux.loc[df1_aux, :].groupby('cuisines', observed = True)['aggregate_rating'].agg(['sum', 'count'])
+    summary.columns = ['rating_sum', 'rating_count']
+    summary['aggregate_rating'] = summary['rating_sum'] / summary['rating_count']
+
+    return summary
+
+
+
+
+
+def cuisine_summary(country_select, cuisines_select, path = DATASET_PATH):
+
+    """ This function returns the cuisine summary of a sidebar selection, built once per selection and dataset version
+        and kept among the most recently used selections
+
+        Input: List of selected countries, list of selected cuisines, dataset path
+        Output: Dataframe indexed by cuisine, queried from the database with the SQL backend
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_cuisine_summary
+        return sql_cuisine_summary(country_select, cuisines_select, path)
+
+    key = (frozenset(country_select), frozenset(cuisines_select))
+
+    return selection_artifact('cuisine_summary', key, lambda: build_cuisine_summary(filter_dataset(country_select, cuisines_select, path), cuisines_select, path), path)
+
+
+
+
+
+def top_cuisines(summary, ascending, top_n = 100):
+
+    """ This function exhibits the top best and worst cuisine types
+
+        Operations:
+        1- Takes the average aggregate_rating of each cuisine from the summary
+        2- Sort the aggregate_rating values depending on the ascending input
+        3- Reset index
+        4- Exhibits the top_n values
+
+        Input: Cuisine summary, ascending type (True or False), number of cuisines
+        Output: cuisines Dataframe
+
+    """
+
+    cuisines = summary[['aggregate_rating']].sort_values('aggregate_rating', ascending = ascending).reset_index().head(top_n)
+
+    return cuisines
+
+
+
+
+
+def build_rating_order(df1):
+
+    """ This function sorts the restaurants of each country once, by aggregate_rating(descending) and restaurant_id(ascending)
+
+        Operations:
+        1- Sorts the row positions of the whole dataset once, keeping missing ratings last as sort_values does
+        2- Stores the rank of each row in that order
+        3- Splits the sorted positions by country, keeping the order inside each country
+
+        Input: Cleaned Dataframe
+        Output: Dictionary with the sorted positions by country and the rank of each row
+
+    """
+
+    order = np.lexsort((df1['restaurant_id'].to_numpy(), -df1['aggregate_rating'].to_numpy(np.float64)))
+    rank = np.empty(len(order), dtype = np.int64)
+    rank[order] = np.arange(len(order))
+
+    countries = df1['country'].cat.codes.to_numpy()[order]
+    by_country = {country: order[countries == code] for code, country in enumerate(df1['country'].cat.categories)}
+
+    return {'countries': by_country, 'rank': rank}
+
+
+
+
+
+def rating_order(path = DATASET_PATH):
+
+    """ This function returns the per country rating order, built once per dataset version
+
+        Input: Dataset path
+        Output: Dictionary with the sorted positions by country and the rank of each row
+
+    """
+
+    return dataset_artifact('rating_order', build_rating_order, path)
+
+
+
+
+
+def first_matches(order, selected, top_n):
+
+    """ This function walks a sorted list of positions until top_n of them are selected
+
+        Operations:
+        1- Checks the positions in blocks, starting with a few times top_n and doubling the block each step
+        2- Stops at the first block that completes top_n matches, so only the head of the list is read
+
+        Input: Sorted positions, boolean array of the selected positions, number of matches
+        Output: First top_n selected positions, in order
+
+    """
+
+    found = []
+    count = 0
+    start = 0
+    block = max(4 * top_n, 256)
+
+    while start < len(order) and count < top_n:
+        chunk = order[start:start + block]
+        chunk = chunk[selected[chunk]]
+        found.append(chunk)
+        count += len(chunk)
+        start += block
+        block *= 2
+
+    return np.concatenate(found)[:top_n] if found else np.empty(0, dtype = np.int64)
+
+
+
+
+
+def top_restaurants(df1, top_n, path = DATASET_PATH):
+
+    """ This function selects the restaurants with the highest ratings
+
+        Operations:
+        1- Marks the restaurants of the filtered dataset by their original row positions
+        2- Walks the presorted order of each selected country until top_n restaurants of the filter are found
+        3- Merges the at most top_n restaurants of each country by their rank in the global order,
+           keeping aggregate_rating(descending) and restaurant_id(ascending)
+        4- Exhibits the top_n values
+        5- Without the original row positions, keeps the top_n with nlargest and sorts only those rows
+
+        Input: Dataframe, number of restaurants, dataset path
+        Output: Dataframe
+
+    """
+
+    top_n = max(top_n, 0)
+    columns = ['restaurant_name', 'restaurant_id', 'aggregate_rating', 'currency']
+
+    if 'index' not in df1.columns:
+        aux = df1.nlargest(top_n, 'aggregate_rating', keep = 'all').loc[:, columns]
+        return aux.sort_values(['aggregate_rating', 'restaurant_id'], ascending = [False, True]).reset_index(drop = True).head(top_n)
+
+    order = rating_order(path)
+    positions = df1['index'].to_numpy()
+
+    lookup = np.full(len(order['rank']), -1)
+    lookup[positions] = np.arange(len(positions))
+    selected = lookup != -1
+
+    candidates = [first_matches(order['countries'][country], selected, top_n) for country in df1['country'].unique()]
+    candidates = np.concatenate(candidates) if candidates else np.empty(0, dtype = np.int64)
+    candidates = candidates[np.argsort(order['rank'][candidates], kind = 'stable')][:top_n]
+
+    return df1[columns].iloc[lookup[candidates]].reset_index(drop = True)
+
+
+
+
+
+def selection_top_restaurants(country_select, cuisines_select, top_n, path = DATASET_PATH):
+
+    """ This function selects the restaurants of a sidebar selection with the highest ratings
+
+        Operations:
+        1- Queries the database with the SQL backend
+        2- Otherwise selects them from the shared filtered view with top_restaurants
+
+        Input: List of selected countries, list of selected cuisines, number of restaurants, dataset path
+        Output: Dataframe
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_top_restaurants
+        return sql_top_restaurants(country_select, cuisines_select, top_n, path)
+
+    return top_restaurants(filter_dataset(country_select, cuisines_select, path), top_n, path)
@@ -0,0 +1,664 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import timed
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(ROOT_DIR, 'dataset', 'zomato.csv')
+
+# Country reference table, used to name the countries and to fill the sidebar country selection
+COUNTRY_TABLE = pd.DataFrame([
+    (1, 'India'),
+    (14, 'Australia'),
+    (30, 'Brazil'),
+    (37, 'Canada'),
+    (94, 'Indonesia'),
+    (148, 'New Zeland'),
+    (162, 'Philippines'),
+    (166, 'Qatar'),
+    (184, 'Singapure'),
+    (189, 'South Africa'),
+    (191, 'Sri Lanka'),
+    (208, 'Turkey'),
+    (214, 'United Arab Emirates'),
+    (215, 'England'),
+    (216, 'United States of America'),
+], columns = ['country_code', 'country'])
+
+# Country name given to codes missing from COUNTRY_TABLE
+UNKNOWN_COUNTRY = os.environ.get('FOME_ZERO_UNKNOWN_COUNTRY', 'Unknown')
+
+# Low cardinality text columns stored as pandas categories
+CATEGORY_COLUMNS = ['country', 'city', 'locality', 'cuisines', 'all_cuisines', 'currency', 'rating_color', 'rating_text']
+
+# Numeric columns downcast to the smallest dtype that holds their values
+INTEGER_COLUMNS = ['restaurant_id', 'country_code', 'average_cost_for_two', 'has_table_booking', 'has_online_delivery',
+                   'is_delivering_now', 'price_range', 'votes']
+FLOAT_COLUMNS = ['aggregate_rating']
+
+# Shared memory serving mode: when set, workers attach to the dataset published in this directory
+# by utils.shared_dataset, and the pointer file inside it names the current version
+SHARED_DIR = os.environ.get('FOME_ZERO_SHARED_DIR', '')
+SHARED_POINTER = 'current'
+
+# Computation backend of the Countries, Cities and Cuisines pages: 'pandas' over the cached dataframe,
+# or 'duckdb' / 'sqlite' queries over the database built by utils.sql_backend
+BACKEND = os.environ.get('FOME_ZERO_BACKEND', 'pandas').lower()
+SQL_BACKEND = BACKEND in ('duckdb', 'sqlite')
+
+# Process-wide cache shared by every Streamlit session:
+# {absolute path: {'mtime': modification times, 'df': dataframe, 'artifacts': {name: value}, 'deltas': applied delta paths}}
+_DATASET_CACHE = {}
+_CACHE_LOCK = threading.RLock()
+
+# Results of sidebar selections kept per dataset version and kind, shared by every session
+MAX_SELECTIONS = int(os.environ.get('FOME_ZERO_MAX_SELECTIONS', '32'))
+
+# Values being built, with the lock their builder holds: {(id of the cache, key): lock}
+_BUILDING = {}
+
+# Entries of the current dataset versions, so the callers of a version being loaded wait for a single load:
+# {(absolute path, modification times): entry}
+_LOADED = {}
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def country_column(country_codes, unknown = UNKNOWN_COUNTRY):
+
+    """ This function maps the country codes to the country names of the reference table
+
+        Operations:
+        1- Finds the position of every code in the reference table with a single vectorized lookup
+        2- Sends the codes missing from the table to the unknown bucket
+        3- Builds a categorical column from those positions, with the countries sorted by name as the
+           pages grouped them before, and the unknown bucket last
+
+        Input: Country codes, unknown bucket name
+        Output: Categorical with the country names
+
+    """
+
+    names = COUNTRY_TABLE['country'].to_numpy()
+    order = np.argsort(names, kind = 'stable')
+
+    codes = pd.Index(COUNTRY_TABLE['country_code']).get_indexer(np.asarray(country_codes))
+    codes = np.where(codes == -1, len(COUNTRY_TABLE), np.argsort(order)[codes])
+    categories = list(names[order]) + [unknown]
+
+    return pd.Categorical.from_codes(codes, categories = categories)
+
+
+
+
+
+def country_options(df1):
+
+    """ This function lists the countries offered on the sidebar country selection
+
+        Operations:
+        1- Takes the countries of the reference table
+        2- Adds the unknown buckets only when the dataset has restaurants in them
+
+        Input: Dataframe
+        Output: List of country names
+
+    """
+
+    options = list(COUNTRY_TABLE['country'])
+    extra = set(df1['country'].unique()) - set(options)
+
+    return options + sorted(extra)
+
+
+
+
+
+def sidebar_countries(path = DATASET_PATH):
+
+    """ This function lists the countries of the sidebar selection
+
+        Operations:
+        1- Queries the database with the SQL backend, so the page does not load the dataset
+        2- Otherwise lists them from the cached dataset with country_options
+
+        Input: Dataset path
+        Output: List of country names
+
+    """
+
+    if SQL_BACKEND:
+        from utils.sql_backend import sql_country_options
+        return sql_country_options(path)
+
+    return country_options(load_dataset(path))
+
+
+
+
+
+def primary_cuisine(cuisines):
+
+    """ This function selects the first cuisine of each comma separated cuisines list
+
+        Operations:
+        1- Factorizes the column, so each distinct list is parsed only once
+        2- Splits the distinct lists with vectorized string operations and keeps the first cuisine
+        3- Maps the result back to the rows, keeping missing values as missing instead of 'nan'
+
+        Input: Cuisines Series
+        Output: Primary cuisine Series
+
+    """
+
+    codes, uniques = pd.factorize(cuisines)
+    primary = pd.Series(uniques, dtype = object).str.split(',', n = 1).str[0].str.strip()
+    primary_codes, primary_names = pd.factorize(primary)
+
+    # The extra -1 at the end keeps the missing values (code -1) missing
+    primary_codes = np.append(primary_codes, -1)
+    primary = pd.Categorical.from_codes(primary_codes[codes], categories = primary_names)
+
+    return pd.Series(primary, index = cuisines.index, name = cuisines.name)
+
+
+
+
+
+def prepare_columns(df):
+
+    """ This function renames the columns and parses the cuisines, without dropping any row
+
+        Types of cleaning:
+        1- Make a copy of the dataframe
+        2- Creates a variable named "title" to capitalize all the words and replace some characters in the string
+        3- Creates a variable named "snakecase" to make an underscored, lowercase form from the expression
+        4- Creates a variable named "space" to remove blank spaces
+        5- Creates a list containing the columns names
+        6- Apply the variable named "title" to edit the column's names
+        7- Apply the variable named "spaces" to edit the column's names
+        8- Apply the variable named "snakecase" to edit the column's names
+        9- Replaces the column's names with the edited column's name
+        10- Keeps the full cuisines list in the all_cuisines column
+        11- Replaces the cuisines column with the first listed cuisine
+
+        Input: Dataframe
+        Output: Dataframe
+
+    """
+
+    import inflection
+
+    df1 = df.copy()
+    title = lambda x: inflection.titleize(x)
+    snakecase = lambda x: inflection.underscore(x)
+    spaces = lambda x: x.replace(" ", "")
+    cols_old = list(df.columns)
+    cols_old = list(map(title, cols_old))
+    cols_old = list(map(spaces, cols_old))
+    cols_new = list(map(snakecase, cols_old))
+    df1.columns = cols_new
+    df1['all_cuisines'] = df1['cuisines']
+    df1['cuisines'] = primary_cuisine(df1['cuisines'])
+
+    return df1
+
+
+
+
+
+def duplicate_subset(df1):
+
+    """ This function lists the columns compared to find duplicated restaurants
+
+        Input: Dataframe returned by prepare_columns
+        Output: List of column names, every column but all_cuisines
+
+    """
+
+    return [col for col in df1.columns if col != 'all_cuisines']
+
+
+
+
+
+def rename_columns(df):
+
+    """ This function cleans the dataset
+
+        Types of cleaning:
+        1- Renames the columns and parses the cuisines with prepare_columns
+        2- Drop duplicates, ignoring the all_cuisines column
+        3- Delete the switch_to_order_menu column
+        4- Reset the index
+
+        Input: Dataframe
+        Output: Dataframe
+
+    """
+
+    df1 = prepare_columns(df)
+    df1 = df1.drop_duplicates(subset = duplicate_subset(df1), keep = 'first')
+    del df1['switch_to_order_menu']
+    df1 = df1.reset_index(drop = True)
+
+    return df1
+
+
+
+
+
+def optimize_dtypes(df1):
+
+    """ This function converts the cleaned dataset to compact dtypes
+
+        Operations:
+        1- Converts the text columns in CATEGORY_COLUMNS to categories
+        2- Downcasts the integer columns in INTEGER_COLUMNS to the smallest integer type
+        3- Downcasts the float columns in FLOAT_COLUMNS to float32 only when no value changes,
+           so rating means stay identical to the ones computed over float64
+
+        Input: Dataframe
+        Output: Dataframe
+
+    """
+
+    df1 = df1.copy()
+
+    for col in CATEGORY_COLUMNS:
+        df1[col] = df1[col].astype('category')
+
+    for col in INTEGER_COLUMNS:
+        df1[col] = pd.to_numeric(df1[col], downcast = 'integer')
+
+    for col in FLOAT_COLUMNS:
+        downcast = df1[col].astype(np.float32)
+        if np.array_equal(downcast.to_numpy(np.float64), df1[col].to_numpy(np.float64), equal_nan = True):
+            df1[col] = downcast
+
+    return df1
+
+
+
+
+
+def memory_report(df_before, df_after):
+
+    """ This function compares the memory usage of two versions of the dataset
+
+        Operations:
+        1- Measures the deep memory usage of each column before and after
+        2- Adds the dtypes and the saved percentage
+        3- Adds a total row
+
+        Input: Dataframe before, Dataframe after
+        Output: Report Dataframe
+
+    """
+
+    report = pd.DataFrame({'dtype_before': df_before.dtypes.astype(str),
+                           'dtype_after': df_after.dtypes.astype(str),
+                           'bytes_before': df_before.memory_usage(index = False, deep = True),
+                           'bytes_after': df_after.memory_usage(index = False, deep = True)})
+    report.loc['total', ['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']].sum()
+    report['saved_pct'] = (100 * (1 - report['bytes_after'] / report['bytes_before'])).round(1)
+
+    return report
+
+
+
+
+
+def clean_dataset(path, optimize = True):
+
+    """ This function runs the full cleaning pipeline over the raw csv file
+
+        Operations:
+        1- Reads the csv file
+        2- Cleans the dataset with rename_columns
+        3- Adds the country column based on the country_code
+        4- Converts the columns to compact dtypes when optimize is True
+
+        Input: Dataset path, optimize (True or False)
+        Output: Dataframe
+
+    """
+
+    with timed('csv_load'):
+        df = pd.read_csv(path)
+
+    with timed('rename_columns'):
+        df1 = rename_columns(df)
+
+    with timed('country_mapping'):
+        df1['country'] = country_column(df1['country_code'])
+
+    if optimize:
+        with timed('optimize_dtypes'):
+            df1 = optimize_dtypes(df1)
+
+    return df1
+
+
+
+
+
+def load_dataset(path = DATASET_PATH):
+
+    """ This function returns the cleaned dataset, parsing the csv only once per process
+
+        Operations:
+        1- Reads the modification time of the dataset file
+        2- Reuses the cached dataframe when the path and modification time did not change
+        3- Otherwise reads the dataset again and replaces the cached entry
+        4- Returns a shallow copy, so pages can add, drop or filter columns without touching the cache
+
+        The dataframe is read-only: its column buffers are shared by every session, and writing
+        values in place (df.loc[...] = ..., fillna(inplace = True)) raises a ValueError instead of
+        changing them. Pages that need to change values work on df.copy()
+
+        Input: Dataset path
+        Output: Dataframe (read-only)
+
+    """
+
+    return _dataset_entry(path)['df'].copy(deep = False)
+
+
+
+
+
+def freeze_dataset(df1):
+
+    """ This function makes the column buffers of a cached dataframe read-only
+
+        Operations:
+        1- Marks the array of each numpy block as not writeable
+        2- Marks the codes of each categorical block as not writeable
+        3- Leaves the Arrow backed columns, whose buffers are already immutable
+
+        Input: Dataframe
+        Output: The same Dataframe
+
+    """
+
+    for block in df1._mgr.blocks:
+        values = getattr(block.values, '_codes', block.values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+
+    return df1
+
+
+
+
+
+def dataset_version(path = DATASET_PATH):
+
+    """ This function identifies the current version of a dataset file
+
+        Input: Dataset path
+        Output: Tuple with the absolute path and the modification time
+
+    """
+
+    path = os.path.abspath(path)
+
+    return (path, source_mtime(path))
+
+
+
+
+
+def source_mtime(path):
+
+    """ This function returns the modification times that version the dataset
+
+        Operations:
+        1- Uses the pointer file of the shared directory in the shared memory serving mode,
+           since publishing a new version replaces it
+        2- Otherwise uses the dataset file and its delta log, which changes whenever a delta is logged
+
+        Input: Dataset path
+        Output: Tuple with the modification times of the dataset and of its delta log, in nanoseconds
+
+    """
+
+    if SHARED_DIR:
+        return (os.stat(os.path.join(SHARED_DIR, SHARED_POINTER)).st_mtime_ns, 0)
+
+    from utils.incremental import log_mtime
+
+    return (os.stat(path).st_mtime_ns, log_mtime(path))
+
+
+
+
+
+def dataset_artifact(name, builder, path = DATASET_PATH):
+
+    """ This function returns a structure derived from the cleaned dataset, building it once per dataset version
+
+        Operations:
+        1- Finds the cached entry of the dataset, reloading it when the file changed
+        2- Reuses the artifact stored under name in that entry
+        3- Otherwise calls builder with the cleaned dataset through cached_build and stores the result,
+           so it is dropped together with the dataset when the file changes
+
+        Input: Artifact name, builder function, dataset path
+        Output: Artifact
+
+    """
+
+    entry = _dataset_entry(path)
+
+    return cached_build(entry['artifacts'], name, lambda: builder(entry['df'].copy(deep = False)))
+
+
+
+
+
+def selection_artifact(name, key, builder, path = DATASET_PATH, max_entries = MAX_SELECTIONS):
+
+    """ This function returns a result of a sidebar selection, building it once per selection and dataset version
+
+        Operations:
+        1- Keeps the results of each kind in an LRU stored as the dataset artifact name, so they are
+           dropped together with the dataset when the file changes
+        2- Reuses the result of the selection when another rerun or session already built it
+        3- Otherwise calls builder and evicts the least recently used selections above max_entries,
+           so memory does not grow with every distinct selection
+
+        Input: Artifact name, selection key, function without arguments, dataset path, maximum number of selections
+        Output: Result
+
+    """
+
+    results = dataset_artifact(name, lambda df1: OrderedDict(), path)
+
+    return cached_build(results, key, builder, max_entries)
+
+
+
+
+
+def cached_build(cache, key, builder, max_entries = None):
+
+    """ This function returns the value cached under a key, calling builder only once when several threads ask for it
+
+        Operations:
+        1- Looks the key up under the cache lock, which is never held while a value is built
+        2- Otherwise takes the build lock of the key, so the callers of the same key wait for a single build
+           while other keys, artifacts and sessions go on in parallel
+        3- Calls builder and stores the value under the cache lock
+        4- With max_entries, keeps the cache as an OrderedDict LRU of at most max_entries values
+
+        Input: Dictionary (OrderedDict with max_entries), key, function without arguments, maximum number of values
+        Output: Value
+
+    """
+
+    with _CACHE_LOCK:
+
+        if key in cache:
+            if max_entries is not None:
+                cache.move_to_end(key)
+            return cache[key]
+
+        guard = _BUILDING.setdefault((id(cache), key), threading.Lock())
+
+    with guard:
+
+        with _CACHE_LOCK:
+            if key in cache:
+                return cache[key]
+
+        value = builder()
+
+        with _CACHE_LOCK:
+
+            cache[key] = value
+            _BUILDING.pop((id(cache), key), None)
+
+            while max_entries is not None and len(cache) > max_entries:
+                cache.popitem(last = False)
+
+    return value
+
+
+
+
+
+def _dataset_entry(path):
+
+    """ This function returns the cache entry of a dataset, loading the dataset when the entry is stale
+
+        Operations:
+        1- Reuses the cached entry when the dataset and its delta log did not change
+        2- Otherwise loads the new version through cached_build, so a single thread reads the dataset
+           while the callers of other datasets and artifacts go on
+        3- Publishes the loaded entry under the cache lock and forgets the previous versions
+
+        Input: Dataset path
+        Output: Cache entry
+
+    """
+
+    path = os.path.abspath(path)
+    mtime = source_mtime(path)
+
+    with _CACHE_LOCK:
+        entry = _DATASET_CACHE.get(path)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry
+
+    entry = cached_build(_LOADED, (path, mtime), lambda: _load_entry(path, mtime))
+
+    with _CACHE_LOCK:
+
+        current = _DATASET_CACHE.get(path)
+        if current is None or current['mtime'] != mtime:
+            _DATASET_CACHE[path] = current = entry
+
+        for key in [key for key in _LOADED if key[0] == path and key[1] != mtime]:
+            del _LOADED[key]
+
+    return current
+
+
+
+
+
+def _load_entry(path, mtime):
+
+    """ This function loads a version of a dataset into a new cache entry
+
+        Operations:
+        1- When only the delta log changed, applies the new deltas to a snapshot of the cached dataset
+           and aggregates, taken under the cache lock since other sessions keep adding to them
+        2- Otherwise reads the dataset and replays its delta log
+        3- Makes the dataset read-only before it is published
+
+        Input: Dataset path, version of the dataset
+        Output: Cache entry
+
+    """
+
+    from utils.incremental import logged_deltas, refresh_entry, replay
+
+    with _CACHE_LOCK:
+        entry = _DATASET_CACHE.get(path)
+        if entry is not None and entry['mtime'] == mtime:
+            return entry
+        if entry is not None:
+            artifacts = {name: value.copy() if isinstance(value, OrderedDict) else value for name, value in entry['artifacts'].items()}
+            entry = dict(entry, artifacts = artifacts)
+
+    if entry is not None and entry['mtime'][0] == mtime[0]:
+        entry = refresh_entry(entry, path, mtime)
+
+    if entry is None or entry['mtime'] != mtime:
+        deltas = [] if SHARED_DIR else logged_deltas(path)
+        entry = {'mtime': mtime, 'df': replay(read_dataset(path), deltas), 'artifacts': {}, 'deltas': deltas}
+
+    freeze_dataset(entry['df'])
+
+    return entry
+
+
+
+
+
+def read_dataset(path):
+
+    """ This function reads the cleaned dataset, preferring the columnar snapshot
+
+        Operations:
+        1- Attaches to the dataset published in SHARED_DIR in the shared memory serving mode
+        2- Otherwise loads the feather snapshot next to the csv, rebuilding it when the csv checksum changed
+        3- Falls back to cleaning the csv directly when pyarrow is not installed
+
+        Input: Dataset path
+        Output: Dataframe
+
+    """
+
+    if SHARED_DIR:
+        from utils.shared_dataset import attach
+        return attach(SHARED_DIR)
+
+    try:
+        from utils.ingest import load_snapshot
+    except ImportError:
+        return clean_dataset(path)
+
+    return load_snapshot(path)
+
+
+
+
+
+def clear_cache():
+
+    """ This function drops every cached dataset, forcing the next load to read the csv again
+
+        Input: None
+        Output: None
+
+    """
+
+    with _CACHE_LOCK:
+        _DATASET_CACHE.clear()
+        _LOADED.clear()
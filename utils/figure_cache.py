@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+
+from utils.data_loader import DATASET_PATH, dataset_version
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Memory cap of the cached figures, measured as the size of their plotly JSON
+MAX_CACHE_BYTES = int(float(os.environ.get('FOME_ZERO_FIGURE_CACHE_MB', '64')) * 2 ** 20)
+
+# Process-wide LRU shared by every Streamlit session: {key: (figure, size in bytes)}
+_FIGURE_CACHE = OrderedDict()
+_FIGURE_LOCK = threading.Lock()
+_cache_bytes = 0
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def normalize_filters(filters):
+
+    """ This function turns the sidebar state into a hashable key that ignores the selection order
+
+        Operations:
+        1- Sorts the filters by name
+        2- Turns each list of selected values into a sorted tuple without duplicates
+
+        Input: Dictionary of filters
+        Output: Tuple of (name, value) pairs
+
+    """
+
+    normalize = lambda x: tuple(sorted(set(x), key = str)) if isinstance(x, (list, tuple, set, frozenset)) else x
+
+    return tuple((name, normalize(value)) for name, value in sorted(filters.items()))
+
+
+
+
+
+def cached_figure(page, chart_id, filters, builder, path = DATASET_PATH):
+
+    """ This function returns a chart figure, building it only once per dataset version and filter state
+
+        Operations:
+        1- Builds the key from the dataset version, page, chart id and normalized filters
+        2- Returns the cached figure when another rerun or session already built it
+        3- Otherwise calls builder and stores the figure with the size of its JSON
+        4- Evicts the least recently used figures while the cache is above MAX_CACHE_BYTES
+
+        Input: Page name, chart id, dictionary of filters, function that builds the figure, dataset path
+        Output: Plotly figure
+
+    """
+
+    global _cache_bytes
+
+    key = (dataset_version(path), page, chart_id, normalize_filters(filters))
+
+    with _FIGURE_LOCK:
+        entry = _FIGURE_CACHE.get(key)
+        if entry is not None:
+            _FIGURE_CACHE.move_to_end(key)
+            return entry[0]
+
+    figure = builder()
+    size = len(figure.to_json())
+
+    with _FIGURE_LOCK:
+
+        if key not in _FIGURE_CACHE and size <= MAX_CACHE_BYTES:
+            _FIGURE_CACHE[key] = (figure, size)
+            _cache_bytes += size
+
+        while _cache_bytes > MAX_CACHE_BYTES:
+            _, (_, evicted) = _FIGURE_CACHE.popitem(last = False)
+            _cache_bytes -= evicted
+
+    return figure
+
+
+
+
+
+def clear_figure_cache():
+
+    """ This function drops every cached figure
+
+        Input: None
+        Output: None
+
+    """
+
+    global _cache_bytes
+
+    with _FIGURE_LOCK:
+        _FIGURE_CACHE.clear()
+        _cache_bytes = 0
@@ -0,0 +1,126 @@
+import numpy as np
+
+from utils.data_loader import DATASET_PATH, dataset_artifact, freeze_dataset, load_dataset, selection_artifact
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Columns with one bitmap per value
+FILTER_COLUMNS = ['country', 'cuisines']
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def build_filter_index(df1):
+
+    """ This function builds one packed bitmap per value of the sidebar filter columns
+
+        Operations:
+        1- Reads the category codes of each filter column
+        2- Packs the rows of each value in a bitmap of len(df1) bits
+        3- Packs the rows with a value (not missing) of each column
+
+        Input: Cleaned Dataframe
+        Output: Dictionary with the number of rows, the non-missing bitmaps and the bitmaps by column and value
+
+    """
+
+    index = {'rows': len(df1), 'valid': {}}
+
+    for col in FILTER_COLUMNS:
+        codes = df1[col].cat.codes.to_numpy()
+        index[col] = {value: np.packbits(codes == code) for code, value in enumerate(df1[col].cat.categories)}
+        index['valid'][col] = np.packbits(codes != -1)
+
+    return index
+
+
+
+
+
+def filter_index(path = DATASET_PATH):
+
+    """ This function returns the filter bitmaps, built once per dataset version
+
+        Input: Dataset path
+        Output: Dictionary with the number of rows, the non-missing bitmaps and the bitmaps by column and value
+
+    """
+
+    return dataset_artifact('filter_index', build_filter_index, path)
+
+
+
+
+
+def selection_mask(col, values, path = DATASET_PATH):
+
+    """ This function returns the rows whose column value is one of the selected values
+
+        Operations:
+        1- Splits the bitmaps of the column into selected and unselected values
+        2- ORs the smaller side, so the default 'everything selected' case ORs nothing
+        3- Inverts the result when the unselected side was used
+        4- Unpacks the bitmap into a boolean mask
+
+        Input: Column name, selected values, dataset path
+        Output: Boolean numpy array
+
+    """
+
+    index = filter_index(path)
+    values = set(values)
+    selected = [bitmap for value, bitmap in index[col].items() if value in values]
+    unselected = [bitmap for value, bitmap in index[col].items() if value not in values]
+    size = (index['rows'] + 7) // 8
+
+    if len(selected) <= len(unselected):
+        bitmap = np.bitwise_or.reduce(selected) if selected else np.zeros(size, dtype = np.uint8)
+    else:
+        bitmap = ~np.bitwise_or.reduce(unselected) if unselected else np.full(size, 255, dtype = np.uint8)
+
+        # Missing values are in no bitmap, so the inversion must not select them
+        bitmap &= index['valid'][col]
+
+    return np.unpackbits(bitmap, count = index['rows']).astype(bool)
+
+
+
+
+
+def filter_dataset(country_select, cuisines_select = None, path = DATASET_PATH):
+
+    """ This function returns the restaurants of the sidebar selection
+
+        Operations:
+        1- Combines the country and cuisine bitmaps of the selection
+        2- Returns the cached dataset itself when the selection keeps every row, as by default
+        3- Otherwise reuses the filtered view of the same selection, built once and kept in the
+           selection LRU of the dataset version
+        4- Keeps the original row positions in the 'index' column, as the pages did with reset_index
+        5- Returns a shallow copy, so the shared frame is only copied if a page changes its columns;
+           like load_dataset, its values are read-only and writing them in place raises a ValueError
+
+        Input: List of selected countries, list of selected cuisines (None keeps every cuisine), dataset path
+        Output: Dataframe (read-only)
+
+    """
+
+    mask = selection_mask('country', country_select, path)
+    if cuisines_select is not None:
+        mask &= selection_mask('cuisines', cuisines_select, path)
+
+    if mask.all():
+        df1 = load_dataset(path)
+        df1.insert(0, 'index', df1.index.to_numpy())
+        return df1
+
+    key = (frozenset(country_select), None if cuisines_select is None else frozenset(cuisines_select))
+    view = selection_artifact('filtered_views', key, lambda: freeze_dataset(load_dataset(path).loc[mask, :].reset_index()), path)
+
+    return view.copy(deep = False)
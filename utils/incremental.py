@@ -0,0 +1,525 @@
+""" Incremental dataset refresh
+
+    A delta file has the columns of the csv plus an optional Action column. Each row upserts the
+    restaurant with its Restaurant ID, or deletes it when Action is 'delete' (only Restaurant ID is
+    read then). Logged deltas are replayed in order over the cleaned csv, and a running dashboard
+    applies the new ones to its cached dataset, updating the per country, per city and per cuisine
+    aggregates by their contributions instead of rebuilding them.
+
+    Usage:
+        python -m utils.incremental DELTA [--csv dataset/zomato.csv]
+
+"""
+
+import os
+import sys
+import shutil
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH, prepare_columns, country_column, optimize_dtypes
+from utils.cuisines import build_cuisine_index
+from utils.cities import build_rating_histogram
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+ACTION_COLUMN = 'Action'
+DELETE_ACTION = 'delete'
+
+# The log sits next to the csv and holds the modification time of the csv it applies to,
+# so replacing the csv with a new feed starts a new log
+LOG_SUFFIX = '.deltas'
+BASE_FILE = 'base'
+DELTA_SUFFIX = '.csv'
+
+# Columns summed per country by the country cube
+COUNTRY_TOTALS = ['restaurant_id', 'votes', 'rating_sum', 'rating_count']
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def delta_log(csv_path):
+
+    """ This function returns the directory of the delta log of a csv file
+
+        Input: Csv path
+        Output: Directory path
+
+    """
+
+    return os.path.splitext(csv_path)[0] + LOG_SUFFIX
+
+
+
+
+
+def log_mtime(csv_path):
+
+    """ This function returns the modification time of the delta log, which changes whenever a delta is logged
+
+        Input: Csv path
+        Output: Modification time in nanoseconds, 0 without a log
+
+    """
+
+    try:
+        return os.stat(delta_log(csv_path)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+
+
+
+def logged_deltas(csv_path):
+
+    """ This function lists the deltas to replay over the csv file, in the order they were logged
+
+        Operations:
+        1- Reads the csv modification time recorded when the log was started
+        2- Ignores the log when the csv changed since, as it was logged against another feed
+
+        Input: Csv path
+        Output: List of delta paths
+
+    """
+
+    directory = delta_log(csv_path)
+
+    try:
+        with open(os.path.join(directory, BASE_FILE)) as file:
+            base = file.read().strip()
+    except OSError:
+        return []
+
+    if base != str(os.stat(csv_path).st_mtime_ns):
+        return []
+
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(DELTA_SUFFIX)]
+
+
+
+
+
+def log_delta(delta_path, csv_path = DATASET_PATH):
+
+    """ This function adds a delta file to the log of the csv file
+
+        Operations:
+        1- Checks that the upserted rows have every column of the csv
+        2- Starts a new log when there is none or the csv changed since it was started
+        3- Copies the delta next to the log and renames it into it, so readers never see a partial file
+
+        Input: Delta path, csv path
+        Output: Logged delta path
+
+    """
+
+    delta = pd.read_csv(delta_path)
+    actions = delta[ACTION_COLUMN] if ACTION_COLUMN in delta.columns else pd.Series('', index = delta.index)
+    missing = pd.read_csv(csv_path, nrows = 0).columns.difference(delta.columns)
+
+    if 'Restaurant ID' in missing or (len(missing) and (actions.str.lower() != DELETE_ACTION).any()):
+        raise ValueError('Delta file is missing the columns: {}'.format(', '.join(missing)))
+
+    directory = delta_log(csv_path)
+    os.makedirs(directory, exist_ok = True)
+    deltas = logged_deltas(csv_path)
+
+    if not deltas:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        with open(os.path.join(directory, BASE_FILE), 'w') as file:
+            file.write(str(os.stat(csv_path).st_mtime_ns))
+
+    path = os.path.join(directory, '{:06d}{}'.format(len(deltas) + 1, DELTA_SUFFIX))
+    tmp_path = '{}.{}.tmp'.format(directory, os.getpid())
+    shutil.copyfile(delta_path, tmp_path)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+
+
+
+def read_delta(delta_path):
+
+    """ This function reads a delta file
+
+        Operations:
+        1- Keeps the last row of each Restaurant ID, so a later row of the same delta wins
+        2- Splits the deleted restaurants from the upserted ones
+        3- Cleans the upserted rows as clean_dataset does
+
+        Input: Delta path
+        Output: Dictionary with the upserted rows (Dataframe, None without any) and the deleted restaurant ids (numpy array)
+
+    """
+
+    delta = pd.read_csv(delta_path)
+    delta = delta.drop_duplicates(subset = 'Restaurant ID', keep = 'last')
+    deleted = delta[ACTION_COLUMN].astype(str).str.lower() == DELETE_ACTION if ACTION_COLUMN in delta.columns else np.zeros(len(delta), dtype = bool)
+
+    deleted_ids = delta.loc[deleted, 'Restaurant ID'].to_numpy()
+
+    # A delta of deletions only may hold nothing but the Restaurant ID and Action columns
+    if deleted.all():
+        return {'upserts': None, 'deleted': deleted_ids}
+
+    upserts = prepare_columns(delta.loc[~deleted, :].drop(columns = ACTION_COLUMN, errors = 'ignore'))
+    del upserts['switch_to_order_menu']
+    upserts['country'] = country_column(upserts['country_code'])
+
+    return {'upserts': upserts.reset_index(drop = True), 'deleted': deleted_ids}
+
+
+
+
+
+def align_categories(df1, rows):
+
+    """ This function gives the rows the columns and category columns of the dataset
+
+        Operations:
+        1- Orders the columns of the rows as in the dataset
+        2- Appends the new values of each category column to its categories, keeping the existing codes
+
+        Input: Cleaned Dataframe, cleaned rows
+        Output: Dataframe, rows
+
+    """
+
+    df1 = df1.copy(deep = False)
+    rows = rows[list(df1.columns)].copy()
+
+    for col in df1.columns:
+
+        if not isinstance(df1[col].dtype, pd.CategoricalDtype):
+            continue
+
+        values = pd.Index(rows[col].dropna().astype(object).unique())
+        categories = df1[col].cat.categories.append(values.difference(df1[col].cat.categories))
+        df1[col] = df1[col].cat.set_categories(categories)
+        rows[col] = rows[col].astype(object).astype(pd.CategoricalDtype(categories))
+
+    return df1, rows
+
+
+
+
+
+def apply_delta(df1, delta):
+
+    """ This function applies a delta to the cleaned dataset
+
+        Operations:
+        1- Replaces the changed restaurants where they are, so their row order is kept
+        2- Drops the deleted restaurants and appends the new ones
+        3- Downcasts the columns again, as a changed value may not fit the previous dtype
+        4- Returns the rows that left and entered the dataset, which are the contributions to the aggregates
+
+        Input: Cleaned Dataframe, delta returned by read_delta
+        Output: Dataframe, removed rows, added rows
+
+    """
+
+    upserts = df1.iloc[:0, :] if delta['upserts'] is None else delta['upserts']
+    ids = df1['restaurant_id'].to_numpy()
+    upsert_ids = upserts['restaurant_id'].to_numpy()
+
+    replaced = pd.Index(upsert_ids).get_indexer(ids)
+    kept = ~np.isin(ids, delta['deleted'])
+    appended = np.flatnonzero(~np.isin(upsert_ids, ids))
+
+    df1, upserts = align_categories(df1, upserts)
+    combined = pd.concat([df1, upserts], ignore_index = True)
+
+    order = np.where(replaced != -1, len(df1) + replaced, np.arange(len(df1)))[kept]
+    order = np.concatenate([order, len(df1) + appended])
+    df_new = optimize_dtypes(combined.iloc[order].reset_index(drop = True))
+
+    removed = df1.loc[(replaced != -1) | ~kept, :]
+    added = df_new.loc[np.isin(df_new['restaurant_id'].to_numpy(), upsert_ids), :]
+
+    return df_new, removed, added
+
+
+
+
+
+def replay(df1, deltas):
+
+    """ This function applies logged deltas to the cleaned dataset, in order
+
+        Input: Cleaned Dataframe, list of delta paths
+        Output: Dataframe
+
+    """
+
+    for delta_path in deltas:
+        df1, _, _ = apply_delta(df1, read_delta(delta_path))
+
+    return df1
+
+
+
+
+
+def add_contributions(current, removed, added):
+
+    """ This function updates additive aggregates with the rows that left and entered the dataset
+
+        Operations:
+        1- Subtracts the aggregates of the removed rows from the ones of the added rows
+        2- Adds the difference to the current aggregates, keeping their order and appending new groups
+
+        Input: Current aggregates, aggregates of the removed rows, aggregates of the added rows
+        Output: Aggregates (Series or Dataframe)
+
+    """
+
+    # Groups or columns found on one side only count as zeros on the other
+    delta = added.sub(removed, fill_value = 0).fillna(0)
+    index = current.index.append(delta.index[~delta.index.isin(current.index)])
+
+    return current.reindex(index, fill_value = 0).add(delta.reindex(index, fill_value = 0), fill_value = 0).fillna(0)
+
+
+
+
+
+def build_country_members(df1):
+
+    """ This function counts the restaurants of each city and primary cuisine of every country
+
+        Input: Cleaned Dataframe
+        Output: Dictionary of Series indexed by (country, city) and (country, cuisines)
+
+    """
+
+    return {col: df1.groupby(['country', col], observed = True).size() for col in ['city', 'cuisines']}
+
+
+
+
+
+def country_totals(rows):
+
+    """ This function sums the additive columns of the country cube
+
+        Input: Cleaned rows
+        Output: Dataframe indexed by country
+
+    """
+
+    return rows.groupby('country', observed = True).agg(restaurant_id = ('restaurant_id', 'count'),
+                                                        votes = ('votes', 'sum'),
+                                                        rating_sum = ('aggregate_rating', 'sum'),
+                                                        rating_count = ('aggregate_rating', 'count')).astype(np.float64)
+
+
+
+
+
+def update_country_cube(cube, members, df_new, removed, added):
+
+    """ This function updates the country cube with the rows that left and entered the dataset
+
+        Operations:
+        1- Adds the counts and sums of the added rows and subtracts the ones of the removed rows
+        2- Updates the restaurants of each city and cuisine of every country the same way,
+           so their distinct counts and the cuisine sets are read from the non empty ones
+        3- Takes the average aggregate_rating from the updated sum and count
+        4- Drops the countries left without restaurants and keeps them sorted by name, as build_country_cube
+
+        Input: Country cube, country members, updated Dataframe, removed rows, added rows
+        Output: Country cube, country members
+
+    """
+
+    members_removed, members_added = build_country_members(removed), build_country_members(added)
+    members = {col: add_contributions(counts, members_removed[col], members_added[col]) for col, counts in members.items()}
+    members = {col: counts[counts > 0].astype(np.int64) for col, counts in members.items()}
+
+    totals = add_contributions(cube[COUNTRY_TOTALS].astype(np.float64), country_totals(removed), country_totals(added))
+    totals = totals.loc[totals['restaurant_id'] > 0, :]
+    totals = totals.sort_index(key = lambda index: index.astype(str))
+    countries = totals.index.astype(object)
+
+    cube = pd.DataFrame(index = pd.CategoricalIndex(countries, categories = df_new['country'].cat.categories, name = 'country'))
+    cube['city'] = members['city'].groupby(level = 'country').size().reindex(countries, fill_value = 0).to_numpy()
+    cube['restaurant_id'] = totals['restaurant_id'].to_numpy(np.int64)
+    cube['votes'] = totals['votes'].to_numpy(np.int64)
+    cube['aggregate_rating'] = (totals['rating_sum'] / totals['rating_count']).to_numpy()
+    cube['rating_sum'] = totals['rating_sum'].to_numpy()
+    cube['rating_count'] = totals['rating_count'].to_numpy(np.int64)
+    cube['cuisines'] = members['cuisines'].groupby(level = 'country').size().reindex(countries, fill_value = 0).to_numpy()
+
+    cuisine_sets = members['cuisines'].reset_index().groupby('country')['cuisines'].agg(frozenset)
+    cube['cuisine_set'] = [cuisine_sets.get(country, frozenset()) for country in countries]
+
+    return cube, members
+
+
+
+
+
+def update_rating_histogram(histogram, removed, added):
+
+    """ This function updates the per city rating histogram with the rows that left and entered the dataset
+
+        Operations:
+        1- Adds the bin counts of the added rows and subtracts the ones of the removed rows
+        2- Drops the cities and bins left without restaurants
+
+        Input: City rating histogram, removed rows, added rows
+        Output: City rating histogram
+
+    """
+
+    histogram = add_contributions(histogram, build_rating_histogram(removed), build_rating_histogram(added))
+    histogram = histogram.loc[histogram.sum(axis = 1) > 0, histogram.sum(axis = 0) > 0]
+
+    return histogram.sort_index(axis = 1).astype(np.int64)
+
+
+
+
+
+def cuisine_totals(rows, country_select, cuisines_select):
+
+    """ This function sums the ratings of the listed cuisines of the rows inside a sidebar selection
+
+        Operations:
+        1- Keeps the rows of the selected countries and primary cuisines, as filter_dataset does
+        2- Lists every cuisine of those rows and keeps the selected ones, except Others
+        3- Sums and counts the aggregate_rating of each cuisine
+
+        Input: Cleaned rows, list of selected countries, list of selected cuisines
+        Output: Dataframe indexed by cuisine with rating_sum and rating_count
+
+    """
+
+    rows = rows.loc[rows['country'].isin(country_select) & rows['cuisines'].isin(cuisines_select), :]
+    index = build_cuisine_index(rows)
+    aux = pd.DataFrame({'cuisines': index['cuisines'].astype(object).to_numpy(),
+                        'aggregate_rating': rows['aggregate_rating'].to_numpy()[index['restaurant'].to_numpy()]})
+    aux = aux.loc[aux['cuisines'].isin(cuisines_select) & (aux['cuisines'] != 'Others'), :]
+    totals = aux.groupby('cuisines')['aggregate_rating'].agg(['sum', 'count']).astype(np.float64)
+    totals.columns = ['rating_sum', 'rating_count']
+
+    return totals
+
+
+
+
+
+def update_cuisine_summary(summary, key, removed, added):
+
+    """ This function updates the cuisine summary of a sidebar selection with the rows that left and entered the dataset
+
+        Input: Cuisine summary, selection key with the selected countries and cuisines, removed rows, added rows
+        Output: Cuisine summary
+
+    """
+
+    country_select, cuisines_select = key
+    totals = summary[['rating_sum', 'rating_count']].astype(np.float64)
+    totals = add_contributions(totals, cuisine_totals(removed, country_select, cuisines_select), cuisine_totals(added, country_select, cuisines_select))
+    totals = totals.loc[totals['rating_count'] > 0, :]
+
+    summary = pd.DataFrame({'rating_sum': totals['rating_sum'], 'rating_count': totals['rating_count'].astype(np.int64)})
+    summary['aggregate_rating'] = summary['rating_sum'] / summary['rating_count']
+
+    return summary.rename_axis('cuisines')
+
+
+
+
+
+def update_artifacts(artifacts, df_old, df_new, removed, added):
+
+    """ This function carries the aggregates of a dataset version over to the next one
+
+        Operations:
+        1- Updates the country cube, the city rating histogram and the cuisine summaries with the contributions
+           of the removed and added rows
+        2- Drops every other structure: the filter bitmaps, row indexes and orders point to row positions,
+           and the sketches and distinct city counts can not subtract a row; they are built again on first use
+
+        Input: Artifacts of the previous version, previous Dataframe, updated Dataframe, removed rows, added rows
+        Output: Artifacts of the updated version
+
+    """
+
+    updated = {}
+
+    if 'country_cube' in artifacts:
+        members = artifacts.get('country_members') or build_country_members(df_old)
+        updated['country_cube'], updated['country_members'] = update_country_cube(artifacts['country_cube'], members, df_new, removed, added)
+
+    if 'rating_histogram' in artifacts:
+        updated['rating_histogram'] = update_rating_histogram(artifacts['rating_histogram'], removed, added)
+
+    if 'cuisine_summary' in artifacts:
+        updated['cuisine_summary'] = OrderedDict((key, update_cuisine_summary(summary, key, removed, added)) for key, summary in artifacts['cuisine_summary'].items())
+
+    return updated
+
+
+
+
+
+def refresh_entry(entry, path, mtime):
+
+    """ This function applies the newly logged deltas to a cached dataset entry
+
+        Operations:
+        1- Lists the logged deltas and keeps the ones the entry did not apply yet
+        2- Applies each of them to the dataset and carries the aggregates over
+        3- Builds a new entry, so sessions still reading the previous one are not affected
+
+        Input: Cache entry, dataset path, version of the dataset
+        Output: Cache entry, or None when the log no longer extends the applied deltas
+
+    """
+
+    deltas = logged_deltas(path)
+    applied = entry['deltas']
+
+    if deltas[:len(applied)] != applied:
+        return None
+
+    df1, artifacts = entry['df'], entry['artifacts']
+
+    for delta_path in deltas[len(applied):]:
+        df_new, removed, added = apply_delta(df1, read_delta(delta_path))
+        artifacts = update_artifacts(artifacts, df1, df_new, removed, added)
+        df1 = df_new
+
+    return {'mtime': mtime, 'df': df1, 'artifacts': artifacts, 'deltas': deltas}
+
+
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Logs a delta of new, changed and deleted restaurants')
+    parser.add_argument('delta')
+    parser.add_argument('--csv', default = DATASET_PATH)
+    args = parser.parse_args()
+
+    print(log_delta(args.delta, args.csv))
+    delta = read_delta(args.delta)
+    print('{} upserted, {} deleted'.format(0 if delta['upserts'] is None else len(delta['upserts']), len(delta['deleted'])), file = sys.stderr)
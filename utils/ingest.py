@@ -0,0 +1,340 @@
+import os
+import sys
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from utils.instrumentation import timed
+from utils.data_loader import (DATASET_PATH, CATEGORY_COLUMNS, INTEGER_COLUMNS, FLOAT_COLUMNS, clean_dataset,
+                               prepare_columns, duplicate_subset, country_column, optimize_dtypes, memory_report)
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+CHECKSUM_KEY = b'fome_zero_source_sha256'
+VERSION_KEY = b'fome_zero_snapshot_version'
+
+# Bump when the cleaning pipeline changes, so snapshots written by older code are rebuilt
+SNAPSHOT_VERSION = b'5'
+
+# Rows per chunk of the streaming ingest, 0 cleans the whole csv at once
+CHUNK_ROWS = int(os.environ.get('FOME_ZERO_INGEST_CHUNK_ROWS', '0'))
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def snapshot_path(csv_path):
+
+    """ This function returns the path of the columnar snapshot stored next to the csv file
+
+        Input: Csv path
+        Output: Snapshot path
+
+    """
+
+    return os.path.splitext(csv_path)[0] + '.feather'
+
+
+
+
+
+def file_checksum(path, block_size = 1 << 20):
+
+    """ This function computes the sha256 checksum of a file
+
+        Operations:
+        1- Reads the file in blocks of block_size bytes
+        2- Updates the sha256 digest with each block
+
+        Input: File path, block size
+        Output: Hexadecimal checksum
+
+    """
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+
+
+
+def snapshot_checksum(path):
+
+    """ This function reads the csv checksum recorded in the snapshot metadata
+
+        Input: Snapshot path
+        Output: Checksum or None when the snapshot is missing, unreadable or from another version
+
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with pa.memory_map(path, 'r') as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    checksum = metadata.get(CHECKSUM_KEY)
+
+    if checksum is None or metadata.get(VERSION_KEY) != SNAPSHOT_VERSION:
+        return None
+
+    return checksum.decode()
+
+
+
+
+
+def snapshot_schema(table, checksum):
+
+    """ This function adds the csv checksum and the snapshot version to the schema metadata
+
+        Input: Arrow table, csv checksum
+        Output: Arrow schema
+
+    """
+
+    metadata = dict(table.schema.metadata or {})
+    metadata[CHECKSUM_KEY] = checksum.encode()
+    metadata[VERSION_KEY] = SNAPSHOT_VERSION
+
+    return table.schema.with_metadata(metadata)
+
+
+
+
+
+def scan_dtypes(csv_path, chunk_size):
+
+    """ This function finds, chunk by chunk, the compact dtypes optimize_dtypes would pick for the whole file
+
+        Operations:
+        1- Reads the csv in chunks of chunk_size rows and prepares their columns
+        2- Keeps the smallest and largest value of the integer columns
+        3- Checks whether the float columns survive float32 without changing any value
+        4- Collects the distinct values of the text columns, keeping the primary cuisines in the
+           order they first appear, as primary_cuisine does over the whole column
+        5- Every chunk then gets the same dtypes, so they can be written to a single snapshot
+
+        Input: Csv path, rows per chunk
+        Output: Dictionary of dtypes by column
+
+    """
+
+    text_columns = [col for col in CATEGORY_COLUMNS if col not in ('country', 'cuisines')]
+    integer_range = {col: (np.inf, -np.inf) for col in INTEGER_COLUMNS}
+    lossless = {col: True for col in FLOAT_COLUMNS}
+    values = {col: set() for col in text_columns}
+    primary = []
+
+    for chunk in pd.read_csv(csv_path, chunksize = chunk_size):
+
+        df1 = prepare_columns(chunk)
+
+        for col in INTEGER_COLUMNS:
+            low, high = integer_range[col]
+            integer_range[col] = (min(low, df1[col].min()), max(high, df1[col].max()))
+
+        for col in FLOAT_COLUMNS:
+            values64 = df1[col].to_numpy(np.float64)
+            lossless[col] &= np.array_equal(values64.astype(np.float32).astype(np.float64), values64, equal_nan = True)
+
+        for col in text_columns:
+            values[col].update(df1[col].dropna().unique())
+
+        primary.append(df1['cuisines'].cat.categories.to_series())
+
+    dtypes = {col: pd.to_numeric(pd.Series(integer_range[col]), downcast = 'integer').dtype for col in INTEGER_COLUMNS}
+    dtypes.update({col: np.dtype(np.float32 if lossless[col] else np.float64) for col in FLOAT_COLUMNS})
+    dtypes.update({col: pd.CategoricalDtype(sorted(values[col])) for col in text_columns})
+    dtypes['cuisines'] = pd.CategoricalDtype(pd.unique(pd.concat(primary)) if primary else [])
+
+    return dtypes
+
+
+
+
+
+def clean_chunks(csv_path, chunk_size, dtypes):
+
+    """ This function streams the cleaned dataset chunk by chunk
+
+        Operations:
+        1- Reads the csv in chunks of chunk_size rows and prepares their columns
+        2- Hashes every row into a 64 bit digest, over the same columns rename_columns compares
+        3- Drops the rows whose digest was seen earlier in the chunk or in a previous chunk,
+           keeping the first one as drop_duplicates does
+        4- Keeps the seen digests in sorted runs, 8 bytes per kept row instead of a copy of the rows,
+           merging the last two runs while the older one is less than twice as long, so each digest
+           is merged a logarithmic number of times and a chunk is looked up in a few runs
+        5- Adds the country column and converts the columns to the dtypes found by scan_dtypes
+
+        Input: Csv path, rows per chunk, dictionary of dtypes by column
+        Output: Generator of Dataframes
+
+    """
+
+    runs = []
+
+    for chunk in pd.read_csv(csv_path, chunksize = chunk_size):
+
+        df1 = prepare_columns(chunk)
+        digests = pd.util.hash_pandas_object(df1[duplicate_subset(df1)], index = False).to_numpy()
+        keep = ~pd.Series(digests).duplicated().to_numpy()
+
+        # Looking the digests up in sorted order keeps the binary searches of the large runs in cache
+        order = np.argsort(digests)
+        ordered = digests[order]
+
+        for seen in runs:
+            positions = np.minimum(np.searchsorted(seen, ordered), len(seen) - 1)
+            keep[order[seen[positions] == ordered]] = False
+
+        if keep.any():
+            runs.append(np.sort(digests[keep]))
+
+        # mergesort finds the two sorted runs and merges them in linear time
+        while len(runs) > 1 and len(runs[-2]) < 2 * len(runs[-1]):
+            last = runs.pop()
+            runs[-1] = np.sort(np.concatenate([runs[-1], last]), kind = 'mergesort')
+
+        df1 = df1.loc[keep, :]
+        del df1['switch_to_order_menu']
+        df1['country'] = country_column(df1['country_code'])
+
+        # astype keeps the chunk category order, since unordered categories compare equal in any order
+        df1['cuisines'] = df1['cuisines'].cat.set_categories(dtypes['cuisines'].categories)
+
+        yield df1.astype(dtypes).reset_index(drop = True)
+
+
+
+
+
+def write_cleaned(csv_path, path, checksum, chunk_size = CHUNK_ROWS):
+
+    """ This function writes the cleaned dataset to an uncompressed Arrow IPC (feather) file
+
+        Operations:
+        1- Runs the cleaning pipeline over the csv file, or streams it in chunks when chunk_size is set,
+           so the peak memory depends on the chunk size instead of the file size
+        2- Stores the csv checksum in the schema metadata
+        3- Writes to a temporary file and renames it, so readers never see a partial file
+
+        Input: Csv path, output path, csv checksum, rows per chunk (0 reads the whole file)
+        Output: Output path
+
+    """
+
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    if not chunk_size:
+        table = pa.Table.from_pandas(clean_dataset(csv_path), preserve_index = False)
+        table = table.replace_schema_metadata(snapshot_schema(table, checksum).metadata)
+        # A single record batch lets readers of the memory map get the numeric columns without a copy
+        feather.write_feather(table, tmp_path, compression = 'uncompressed', chunksize = max(table.num_rows, 1))
+        os.replace(tmp_path, path)
+        return path
+
+    dtypes = scan_dtypes(csv_path, chunk_size)
+    writer = None
+    schema = None
+
+    try:
+        for df1 in clean_chunks(csv_path, chunk_size, dtypes):
+            table = pa.Table.from_pandas(df1, schema = schema, preserve_index = False)
+            if writer is None:
+                schema = snapshot_schema(table, checksum)
+                writer = pa.ipc.new_file(tmp_path, schema)
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    writer.close()
+    os.replace(tmp_path, path)
+
+    return path
+
+
+
+
+
+def build_snapshot(csv_path = DATASET_PATH, checksum = None, chunk_size = CHUNK_ROWS):
+
+    """ This function writes the cleaned dataset to the feather snapshot next to the csv file
+
+        Input: Csv path, csv checksum (computed when not given), rows per chunk (0 reads the whole file)
+        Output: Snapshot path
+
+    """
+
+    if checksum is None:
+        checksum = file_checksum(csv_path)
+
+    return write_cleaned(csv_path, snapshot_path(csv_path), checksum, chunk_size)
+
+
+
+
+
+def load_snapshot(csv_path = DATASET_PATH):
+
+    """ This function loads the cleaned dataset from its memory mapped snapshot
+
+        Operations:
+        1- Compares the csv checksum with the one recorded in the snapshot
+        2- Rebuilds the snapshot when they differ or the snapshot is missing
+        3- Cleans the csv directly when the snapshot can not be written (read-only deploys)
+        4- Reads the snapshot through a memory map
+
+        Input: Csv path
+        Output: Dataframe
+
+    """
+
+    path = snapshot_path(csv_path)
+    checksum = file_checksum(csv_path)
+
+    if snapshot_checksum(path) != checksum:
+        try:
+            with timed('snapshot_build'):
+                build_snapshot(csv_path, checksum)
+        except OSError:
+            return clean_dataset(csv_path)
+
+    with timed('snapshot_load'):
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+
+        return table.to_pandas(split_blocks = True)
+
+
+
+
+
+if __name__ == '__main__':
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    print(build_snapshot(csv_path))
+
+    df1 = clean_dataset(csv_path, optimize = False)
+    print(memory_report(df1, optimize_dtypes(df1)).to_string())
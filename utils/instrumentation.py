@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Opt-in: FOME_ZERO_PROFILE=1 logs the stage timings, FOME_ZERO_PROFILE_PANEL=1 also shows them on the sidebar
+ENABLED = os.environ.get('FOME_ZERO_PROFILE', '0') not in ('', '0')
+PANEL = ENABLED and os.environ.get('FOME_ZERO_PROFILE_PANEL', '0') not in ('', '0')
+
+# Timings kept per (page, stage) for the aggregated percentiles
+MAX_SAMPLES = 1000
+
+PERCENTILES = [50, 90, 99]
+
+SESSION_KEY = 'fome_zero_timings'
+
+logger = logging.getLogger('fome_zero.timings')
+
+if ENABLED and not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+# Process-wide samples shared by every Streamlit session: {(page, stage): deque of seconds}
+_SAMPLES = defaultdict(lambda: deque(maxlen = MAX_SAMPLES))
+_SAMPLES_LOCK = threading.Lock()
+
+# Each Streamlit session runs its script in its own thread, so the current rerun is thread local
+_RERUN = threading.local()
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def begin_rerun(page):
+
+    """ This function starts timing a page rerun
+
+        Operations:
+        1- Does nothing unless the instrumentation is enabled
+        2- Stores the page, a rerun id and the start time of the rerun in the current thread
+
+        Input: Page name
+        Output: None
+
+    """
+
+    if not ENABLED:
+        return
+
+    _RERUN.page = page
+    _RERUN.id = uuid.uuid4().hex[:8]
+    _RERUN.start = time.perf_counter()
+    _RERUN.timings = []
+
+
+
+
+
+def timed(stage):
+
+    """ This function returns a context manager that times a stage of the current rerun
+
+        Input: Stage name
+        Output: Context manager (a no-op one when the instrumentation is disabled)
+
+    """
+
+    if not ENABLED:
+        return nullcontext()
+
+    return _timer(stage)
+
+
+
+
+
+@contextmanager
+def _timer(stage):
+
+    """ This function times the wrapped block and records it, even when the block raises
+
+        Input: Stage name
+        Output: Context manager
+
+    """
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+
+
+
+def record(stage, seconds):
+
+    """ This function records the timing of a stage
+
+        Operations:
+        1- Logs the timing as a JSON line, with the page and rerun it belongs to
+        2- Adds it to the process-wide samples of its page and stage
+        3- Adds it to the timings of the current rerun
+
+        Input: Stage name, seconds
+        Output: None
+
+    """
+
+    page = getattr(_RERUN, 'page', None)
+    rerun = getattr(_RERUN, 'id', None)
+
+    logger.info(json.dumps({'page': page, 'rerun': rerun, 'stage': stage, 'ms': round(seconds * 1000, 3)}))
+
+    with _SAMPLES_LOCK:
+        _SAMPLES[(page, stage)].append(seconds)
+
+    timings = getattr(_RERUN, 'timings', None)
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+
+
+
+def bind(func):
+
+    """ This function attaches a function to the current rerun, so the stages it times from another thread
+        are recorded with the page and rerun that started it
+
+        Operations:
+        1- Returns the function itself when the instrumentation is disabled
+        2- Otherwise copies the rerun state of the current thread
+        3- Sets that state in the thread that runs the function and restores the thread state afterwards
+
+        Input: Function
+        Output: Function
+
+    """
+
+    if not ENABLED:
+        return func
+
+    state = dict(vars(_RERUN))
+
+    def run(*args, **kwargs):
+
+        previous = dict(vars(_RERUN))
+        vars(_RERUN).update(state)
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            vars(_RERUN).clear()
+            vars(_RERUN).update(previous)
+
+    return run
+
+
+
+
+
+def timing_summary(samples):
+
+    """ This function summarizes timings by stage
+
+        Operations:
+        1- Counts the samples of each stage
+        2- Computes the mean and the PERCENTILES in milliseconds
+
+        Input: Dictionary of lists of seconds by stage
+        Output: Dataframe indexed by stage
+
+    """
+
+    rows = {}
+
+    for stage, seconds in samples.items():
+        ms = np.asarray(seconds, dtype = np.float64) * 1000
+        rows[stage] = dict(count = len(ms), mean_ms = ms.mean(), **{'p{}_ms'.format(p): np.percentile(ms, p) for p in PERCENTILES})
+
+    return pd.DataFrame.from_dict(rows, orient = 'index').round(2)
+
+
+
+
+
+def page_samples(page):
+
+    """ This function returns the process-wide samples of a page
+
+        Input: Page name
+        Output: Dictionary of lists of seconds by stage
+
+    """
+
+    with _SAMPLES_LOCK:
+        return {stage: list(seconds) for (name, stage), seconds in _SAMPLES.items() if name == page and seconds}
+
+
+
+
+
+def end_rerun():
+
+    """ This function finishes timing a page rerun
+
+        Operations:
+        1- Records the whole rerun as the 'rerun' stage
+        2- Adds the rerun timings to the samples of the Streamlit session
+        3- Shows the session and process-wide percentiles on the sidebar when the panel is enabled
+
+        Input: None
+        Output: None
+
+    """
+
+    if not ENABLED or getattr(_RERUN, 'timings', None) is None:
+        return
+
+    record('rerun', time.perf_counter() - _RERUN.start)
+
+    import streamlit as st
+
+    session = st.session_state.setdefault(SESSION_KEY, {})
+    for stage, seconds in _RERUN.timings:
+        session.setdefault((_RERUN.page, stage), deque(maxlen = MAX_SAMPLES)).append(seconds)
+
+    if PANEL:
+        with st.sidebar.expander('Timings'):
+            st.markdown('Last rerun')
+            st.dataframe(pd.DataFrame(_RERUN.timings, columns = ['stage', 'seconds']).set_index('stage').mul(1000).round(2).rename(columns = {'seconds': 'ms'}))
+            st.markdown('This session')
+            st.dataframe(timing_summary({stage: seconds for (page, stage), seconds in session.items() if page == _RERUN.page}))
+            st.markdown('Every session')
+            st.dataframe(timing_summary(page_samples(_RERUN.page)))
+
+    _RERUN.timings = None
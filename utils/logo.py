@@ -0,0 +1,43 @@
+import os
+import threading
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Resolved from the project root, so the logo loads whatever directory streamlit was started from
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'imagem_fome_zero.png')
+
+# Decoded images shared by every Streamlit session: {path: image}
+_LOGOS = {}
+_LOGOS_LOCK = threading.Lock()
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def sidebar_logo(path = LOGO_PATH):
+
+    """ This function returns the sidebar logo, decoded only once per process
+
+        Operations:
+        1- Reuses the decoded image when another rerun, page or session already loaded it
+        2- Otherwise imports PIL, opens the image and decodes it right away, so the file is closed
+
+        Input: Image path
+        Output: PIL image
+
+    """
+
+    with _LOGOS_LOCK:
+
+        if path not in _LOGOS:
+            from PIL import Image
+            image = Image.open(path)
+            image.load()
+            _LOGOS[path] = image
+
+        return _LOGOS[path]
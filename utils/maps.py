@@ -0,0 +1,183 @@
+import numpy as np
+
+from utils.data_loader import DATASET_PATH, dataset_artifact
+from utils.filters import selection_mask
+from utils.spatial import DETAIL_ZOOM, visible_cells, selection_bounds, bounds_zoom
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Client-side marker factory: each row is [latitude, longitude, popup html]
+MARKER_CALLBACK = """function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]));
+    marker.bindPopup(row[2]);
+    return marker;
+}"""
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def html_text(series):
+
+    """ This function converts a column to html escaped text
+
+        Input: Series
+        Output: Series of strings
+
+    """
+
+    return (series.astype(str)
+                  .str.replace('&', '&amp;', regex = False)
+                  .str.replace('<', '&lt;', regex = False)
+                  .str.replace('>', '&gt;', regex = False))
+
+
+
+
+
+def build_markers(df1):
+
+    """ This function builds the marker rows of every restaurant
+
+        Operations:
+        1- Formats the popup of every restaurant with vectorized string concatenation
+        2- Keeps the latitude, longitude and popup columns
+
+        Input: Cleaned Dataframe
+        Output: Dataframe with latitude, longitude and popup
+
+    """
+
+    popup = ('Name: ' + html_text(df1['restaurant_name']) +
+             '<br>Country: ' + html_text(df1['country']) +
+             '<br>City: ' + html_text(df1['city']) +
+             '<br>Rating: ' + html_text(df1['aggregate_rating']))
+
+    return df1[['latitude', 'longitude']].assign(popup = popup)
+
+
+
+
+
+def marker_data(country_select, bounds = None, path = DATASET_PATH):
+
+    """ This function returns the marker rows of the selected countries as a plain list
+
+        Operations:
+        1- Takes the marker rows built once per dataset version
+        2- Keeps the restaurants of the selected countries inside the visible bounds
+        3- Converts them to the [latitude, longitude, popup] list sent to the browser
+
+        Input: List of selected countries, visible bounds, dataset path
+        Output: List of marker rows
+
+    """
+
+    markers = dataset_artifact('markers', build_markers, path)
+    selected = selection_mask('country', country_select, path)
+
+    if bounds is not None:
+        selected &= ((markers['latitude'] >= bounds['south']) & (markers['latitude'] <= bounds['north']) &
+                     (markers['longitude'] >= bounds['west']) & (markers['longitude'] <= bounds['east'])).to_numpy()
+
+    return markers.loc[selected, :].values.tolist()
+
+
+
+
+
+def map_viewport(view, country_select, path = DATASET_PATH):
+
+    """ This function reads the zoom and visible bounds of the map
+
+        Operations:
+        1- Uses the zoom, bounds and center reported by st_folium on the previous rerun
+        2- Otherwise frames the selected countries and estimates the zoom that fits them
+
+        Input: Map state returned by st_folium, list of selected countries, dataset path
+        Output: Zoom level, visible bounds, center (None when the map must be fitted to the bounds)
+
+    """
+
+    view = view or {}
+    south_west = (view.get('bounds') or {}).get('_southWest') or {}
+    north_east = (view.get('bounds') or {}).get('_northEast') or {}
+
+    if view.get('zoom') is not None and south_west.get('lat') is not None and north_east.get('lat') is not None:
+        bounds = {'south': south_west['lat'], 'west': south_west['lng'], 'north': north_east['lat'], 'east': north_east['lng']}
+        center = view.get('center') or {'lat': (bounds['south'] + bounds['north']) / 2, 'lng': (bounds['west'] + bounds['east']) / 2}
+        return int(view['zoom']), bounds, [center['lat'], center['lng']]
+
+    bounds = selection_bounds(country_select, path)
+
+    return (bounds_zoom(bounds) if bounds is not None else 0), bounds, None
+
+
+
+
+
+def add_cells(m, cells):
+
+    """ This function draws the grid cells on the map
+
+        Operations:
+        1- Draws one circle per visible cell at the centroid of its restaurants
+        2- Scales the radius with the restaurants count
+        3- Shows the count, mean aggregate_rating and votes on the tooltip
+
+        Input: Folium map, visible cells Dataframe
+        Output: None
+
+    """
+
+    import folium
+
+    radius = 6 + 3 * np.log2(cells['count'].to_numpy())
+    tooltip = (cells['count'].astype(str) + ' restaurants<br>Rating: ' + cells['aggregate_rating'].round(2).astype(str) +
+               '<br>Votes: ' + cells['votes'].astype(str))
+
+    for latitude, longitude, size, text in zip(cells['latitude'], cells['longitude'], radius, tooltip):
+        folium.CircleMarker([latitude, longitude], radius = size, tooltip = text, fill = True, weight = 1).add_to(m)
+
+
+
+
+
+def restaurant_map(country_select, view = None, path = DATASET_PATH):
+
+    """ This function creates the restaurants map of the selected countries
+
+        Operations:
+        1- Reads the zoom and bounds of the map from the previous rerun
+        2- Below DETAIL_ZOOM, draws only the precomputed grid cells visible on the map
+        3- From DETAIL_ZOOM on, sends the visible restaurants in a single FastMarkerCluster layer,
+           which builds and clusters the markers on the browser
+
+        Input: List of selected countries, map state returned by st_folium, dataset path
+        Output: Folium map
+
+    """
+
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    zoom, bounds, center = map_viewport(view, country_select, path)
+
+    if center is not None:
+        m = folium.Map(location = center, zoom_start = zoom)
+    else:
+        m = folium.Map()
+        if bounds is not None:
+            m.fit_bounds([[bounds['south'], bounds['west']], [bounds['north'], bounds['east']]])
+
+    if zoom < DETAIL_ZOOM:
+        add_cells(m, visible_cells(country_select, zoom, bounds, path))
+    else:
+        FastMarkerCluster(marker_data(country_select, bounds, path), callback = MARKER_CALLBACK).add_to(m)
+
+    return m
@@ -0,0 +1,111 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.instrumentation import bind, timed
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Threads of the pool shared by every page rerun and Streamlit session, which runs the jobs a page marks as
+# background (the Overview map); 0 runs them in the script thread too. The other jobs run in the script thread
+# when the page reads them: plotly builds the figures in pure Python, which holds the GIL, so pooling the
+# Countries and Cities charts made their cold reruns slower (507 ms to 798 ms on Countries), and concurrent
+# first uses of plotly in one process can fail. Jobs share the process-wide caches, so threads are used
+# instead of processes
+WORKERS = int(os.environ.get('FOME_ZERO_PAGE_WORKERS', '4'))
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+class InlineJob:
+
+    """ Job computed by the script thread the first time its result is read, with the interface of a future """
+
+    def __init__(self, stage, func):
+        self.stage = stage
+        self.func = func
+        self.done = False
+        self.value = None
+
+    def result(self):
+        if not self.done:
+            self.value = run_job(self.stage, self.func)
+            self.done = True
+        return self.value
+
+
+
+
+
+def job_pool(workers = WORKERS):
+
+    """ This function returns the thread pool shared by every page rerun, created on first use
+
+        Input: Number of threads
+        Output: ThreadPoolExecutor
+
+    """
+
+    global _POOL
+
+    with _POOL_LOCK:
+
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers = workers, thread_name_prefix = 'fome_zero_jobs')
+
+        return _POOL
+
+
+
+
+
+def run_job(stage, func):
+
+    """ This function runs a job as a timed stage of the rerun
+
+        Input: Stage name, function without arguments
+        Output: Result of the function
+
+    """
+
+    with timed(stage):
+        return func()
+
+
+
+
+
+def submit_jobs(jobs, background = (), workers = WORKERS):
+
+    """ This function starts the chart and metric jobs of a page rerun
+
+        Operations:
+        1- Submits the background jobs to the shared thread pool in the order given
+        2- Defers the other jobs until the page reads their result, computing them in the script thread
+        3- Times each job as its own stage of the rerun that submitted it
+        4- The page renders in its layout order by reading the results in that order, and a job that fails
+           raises its error there
+
+        Input: Dictionary of functions without arguments by stage name, stage names of the background jobs, number of threads
+        Output: Dictionary of futures by stage name
+
+    """
+
+    futures = {}
+
+    for stage, func in jobs.items():
+        if workers > 0 and stage in background:
+            futures[stage] = job_pool(workers).submit(bind(run_job), stage, func)
+        else:
+            futures[stage] = InlineJob(stage, func)
+
+    return futures
@@ -0,0 +1,238 @@
+import os
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH, dataset_artifact
+from utils.cuisines import restaurant_cuisines
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Opt-in approximate mode: distinct counts of a selection merge HyperLogLog sketches instead of scanning rows
+APPROXIMATE = os.environ.get('FOME_ZERO_APPROX', '0') not in ('', '0')
+
+# Relative standard error of the estimates, which sets the number of registers of each sketch
+ERROR_BOUND = float(os.environ.get('FOME_ZERO_APPROX_ERROR', '0.02'))
+
+# Columns counted on the Overview metrics, sketched per country
+SKETCH_COLUMNS = ['restaurant_name', 'city', 'cuisines']
+
+APPROXIMATE_HELP = 'Approximate distinct count (HyperLogLog), relative standard error {:.1%}'
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def sketch_precision(error_bound):
+
+    """ This function finds the number of register bits that keeps the standard error below the bound
+
+        Operations:
+        1- Solves 1.04 / sqrt(2 ** precision) <= error_bound
+        2- Clips the precision between 4 (16 registers) and 18 (262144 registers)
+
+        Input: Relative standard error
+        Output: Precision in bits
+
+    """
+
+    return int(min(max(math.ceil(2 * math.log2(1.04 / error_bound)), 4), 18))
+
+
+PRECISION = sketch_precision(ERROR_BOUND)
+
+
+
+
+
+def bit_length(values):
+
+    """ This function returns the number of significant bits of each 64 bit integer
+
+        Operations:
+        1- Splits each value in its high and low 32 bits, which float64 log2 handles exactly
+        2- Counts the bits of the high half when it is not zero, otherwise of the low half
+
+        Input: Numpy array of uint64
+        Output: Numpy array of int64
+
+    """
+
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bits = lambda x: np.where(x > 0, np.floor(np.log2(np.maximum(x, 1))) + 1, 0)
+
+    return np.where(high > 0, 32 + bits(high), bits(low)).astype(np.int64)
+
+
+
+
+
+def build_sketches(df1, group_cols, value_col, precision = PRECISION):
+
+    """ This function builds one HyperLogLog sketch of a column for each group
+
+        Operations:
+        1- Numbers the groups and factorizes the column, hashing each distinct value once
+        2- Keeps each (group, value) pair once, so repeated values cost nothing
+        3- Uses the first precision bits of the hash as the register and the position of the
+           first set bit of the remaining bits as the rank
+        4- Keeps the largest rank of each register of each group; missing values are not counted
+
+        Input: Dataframe, list of group columns, value column, precision in bits
+        Output: Dictionary with the group index and the registers (one uint8 row per group)
+
+    """
+
+    grouped = df1.groupby(group_cols, observed = True, sort = True)
+    groups = grouped.ngroup().to_numpy()
+    codes, uniques = pd.factorize(df1[value_col])
+    hashes = pd.util.hash_array(np.asarray(uniques, dtype = object))
+
+    selected = codes != -1
+    pairs = np.unique(groups[selected].astype(np.int64) * len(uniques) + codes[selected])
+    groups, codes = pairs // max(len(uniques), 1), pairs % max(len(uniques), 1)
+
+    rest_bits = np.uint64(64 - precision)
+    registers = (hashes >> rest_bits).astype(np.int64)
+    ranks = (64 - precision) - bit_length(hashes & np.uint64((1 << (64 - precision)) - 1)) + 1
+
+    sketches = np.zeros((grouped.ngroups, 1 << precision), dtype = np.uint8)
+    np.maximum.at(sketches, (groups, registers[codes]), ranks[codes].astype(np.uint8))
+
+    return {'index': grouped.size().index, 'registers': sketches}
+
+
+
+
+
+def estimate(registers):
+
+    """ This function estimates the distinct count of each sketch
+
+        Operations:
+        1- Computes the raw HyperLogLog estimate from the harmonic mean of the registers
+        2- Uses linear counting over the empty registers for small counts
+        3- Rounds to the nearest integer (64 bit hashes need no large range correction)
+
+        Input: Registers, one row per sketch (or a single row)
+        Output: Numpy array of estimates (or a single estimate)
+
+    """
+
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis = 1)
+    zeros = np.sum(registers == 0, axis = 1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    counts = np.rint(np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)).astype(np.int64)
+
+    return counts if len(counts) > 1 else counts[0]
+
+
+
+
+
+def country_sketches(path = DATASET_PATH):
+
+    """ This function returns the per country sketches of the SKETCH_COLUMNS, built once per dataset version
+
+        Input: Dataset path
+        Output: Dictionary of sketches by column
+
+    """
+
+    return dataset_artifact('country_sketches', lambda df1: {col: build_sketches(df1, ['country'], col) for col in SKETCH_COLUMNS}, path)
+
+
+
+
+
+def approximate_nunique(column, country_select, path = DATASET_PATH):
+
+    """ This function estimates the distinct values of a column over the selected countries
+
+        Operations:
+        1- Takes the sketches of the selected countries
+        2- Merges them with an element-wise max, which equals the sketch of the union of their rows
+
+        Input: Column name, list of selected countries, dataset path
+        Output: Estimated distinct count
+
+    """
+
+    sketches = country_sketches(path)[column]
+    selected = sketches['registers'][sketches['index'].isin(country_select)]
+
+    if not len(selected):
+        return 0
+
+    return estimate(selected.max(axis = 0))
+
+
+
+
+
+def city_cuisine_sketches(path = DATASET_PATH):
+
+    """ This function returns the sketches of the listed cuisines of each (country, city), built once per dataset version
+
+        Input: Dataset path
+        Output: Dictionary with the (country, city) index and the registers
+
+    """
+
+    return dataset_artifact('city_cuisine_sketches', lambda df1: build_sketches(restaurant_cuisines(df1, ['country', 'city'], path), ['country', 'city'], 'cuisines'), path)
+
+
+
+
+
+def approximate_city_cuisines(country_select, path = DATASET_PATH):
+
+    """ This function estimates the distinct listed cuisines of each city of the selected countries
+
+        Operations:
+        1- Takes the (country, city) sketches of the selected countries
+        2- Merges the sketches of the cities found in several countries
+        3- Estimates each city, sorted by city
+
+        Input: List of selected countries, dataset path
+        Output: Series indexed by city
+
+    """
+
+    sketches = city_cuisine_sketches(path)
+    selected = sketches['index'].get_level_values('country').isin(country_select)
+    cities = sketches['index'].get_level_values('city')[selected]
+
+    codes, uniques = pd.factorize(cities, sort = True)
+    merged = np.zeros((len(uniques), sketches['registers'].shape[1]), dtype = np.uint8)
+    np.maximum.at(merged, codes, sketches['registers'][selected])
+
+    counts = estimate(merged) if len(uniques) else np.empty(0, dtype = np.int64)
+
+    return pd.Series(np.atleast_1d(counts), index = pd.Index(uniques, name = 'city'), name = 'cuisines')
+
+
+
+
+
+def approximate_label(value):
+
+    """ This function marks a metric value as approximate
+
+        Input: Estimated value
+        Output: Text
+
+    """
+
+    return '≈ {:,}'.format(value)
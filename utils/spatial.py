@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH, dataset_artifact
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# From this zoom level on the map shows the restaurants themselves instead of grid cells
+DETAIL_ZOOM = 12
+
+# Each map tile (256px) is split in 2 ** CELL_SPLIT cells per side, so a cell is about 32px wide
+CELL_SPLIT = 3
+
+CELL_COLUMNS = ['count', 'latitude_sum', 'longitude_sum', 'rating_sum', 'votes']
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def cell_size(zoom):
+
+    """ This function returns the side, in degrees, of the grid cells used at a zoom level
+
+        Input: Zoom level
+        Output: Cell size in degrees
+
+    """
+
+    return 360.0 / 2 ** (zoom + CELL_SPLIT)
+
+
+
+
+
+def build_spatial_index(df1):
+
+    """ This function aggregates the restaurants in grid cells for every zoom level below DETAIL_ZOOM
+
+        Operations:
+        1- Computes the grid cell of every restaurant at each zoom level
+        2- Groups by country, zoom and cell, counting the restaurants and summing the coordinates,
+           aggregate_rating and votes, so cells of several countries can be merged later
+        3- Splits the cells by country and zoom
+        4- Keeps the bounding box of every country, used to frame the map on the first render
+
+        Input: Cleaned Dataframe
+        Output: Dictionary with the cells by (country, zoom) and the country bounds
+
+    """
+
+    aux = df1.loc[:, ['country', 'latitude', 'longitude', 'aggregate_rating', 'votes']]
+    frames = []
+
+    for zoom in range(DETAIL_ZOOM):
+
+        size = cell_size(zoom)
+        cells = aux.assign(zoom = zoom,
+                           x = np.floor((aux['longitude'] + 180) / size).astype(np.int32),
+                           y = np.floor((aux['latitude'] + 90) / size).astype(np.int32))
+        cells = cells.groupby(['country', 'zoom', 'x', 'y'], observed = True).agg(count = ('latitude', 'size'),
+                                                                                 latitude_sum = ('latitude', 'sum'),
+                                                                                 longitude_sum = ('longitude', 'sum'),
+                                                                                 rating_sum = ('aggregate_rating', 'sum'),
+                                                                                 votes = ('votes', 'sum'))
+        frames.append(cells.reset_index())
+
+    cells = pd.concat(frames, ignore_index = True)
+    bounds = aux.groupby('country', observed = True).agg(south = ('latitude', 'min'), north = ('latitude', 'max'),
+                                                         west = ('longitude', 'min'), east = ('longitude', 'max'))
+
+    return {'cells': {key: group[['x', 'y'] + CELL_COLUMNS] for key, group in cells.groupby(['country', 'zoom'], observed = True)},
+            'bounds': bounds}
+
+
+
+
+
+def spatial_index(path = DATASET_PATH):
+
+    """ This function returns the grid cells index, built once per dataset version
+
+        Input: Dataset path
+        Output: Dictionary with the cells by (country, zoom) and the country bounds
+
+    """
+
+    return dataset_artifact('spatial_index', build_spatial_index, path)
+
+
+
+
+
+def selection_bounds(country_select, path = DATASET_PATH):
+
+    """ This function returns the bounding box of the selected countries
+
+        Input: List of selected countries, dataset path
+        Output: Dictionary with south, north, west and east, or None for an empty selection
+
+    """
+
+    bounds = spatial_index(path)['bounds']
+    bounds = bounds.loc[bounds.index.isin(country_select), :]
+
+    if bounds.empty:
+        return None
+
+    return {'south': bounds['south'].min(), 'north': bounds['north'].max(),
+            'west': bounds['west'].min(), 'east': bounds['east'].max()}
+
+
+
+
+
+def bounds_zoom(bounds):
+
+    """ This function estimates the zoom level that fits a bounding box on the map
+
+        Input: Dictionary with south, north, west and east
+        Output: Zoom level
+
+    """
+
+    span = max(bounds['east'] - bounds['west'], 2 * (bounds['north'] - bounds['south']), 1e-6)
+
+    return int(np.clip(np.floor(np.log2(360 / span)), 0, 18))
+
+
+
+
+
+def visible_cells(country_select, zoom, bounds = None, path = DATASET_PATH):
+
+    """ This function returns the grid cells of the selected countries visible on the map
+
+        Operations:
+        1- Picks the precomputed cells of each selected country at the zoom level
+        2- Merges the cells shared by several countries
+        3- Keeps only the cells intersecting the visible bounds
+        4- Computes the cell centroid and the mean aggregate_rating
+
+        Input: List of selected countries, zoom level, visible bounds, dataset path
+        Output: Dataframe with one row per visible cell
+
+    """
+
+    cells = spatial_index(path)['cells']
+    zoom = int(np.clip(zoom, 0, DETAIL_ZOOM - 1))
+    selected = [cells[(country, zoom)] for country in country_select if (country, zoom) in cells]
+
+    if not selected:
+        return pd.DataFrame(columns = ['x', 'y', 'latitude', 'longitude', 'aggregate_rating'] + CELL_COLUMNS)
+
+    aux = pd.concat(selected, ignore_index = True)
+
+    if len(selected) > 1:
+        aux = aux.groupby(['x', 'y'], as_index = False).sum()
+
+    if bounds is not None:
+        size = cell_size(zoom)
+        visible = ((aux['x'] >= np.floor((bounds['west'] + 180) / size)) & (aux['x'] <= np.floor((bounds['east'] + 180) / size)) &
+                   (aux['y'] >= np.floor((bounds['south'] + 90) / size)) & (aux['y'] <= np.floor((bounds['north'] + 90) / size)))
+        aux = aux.loc[visible, :]
+
+    return aux.assign(latitude = aux['latitude_sum'] / aux['count'],
+                      longitude = aux['longitude_sum'] / aux['count'],
+                      aggregate_rating = aux['rating_sum'] / aux['count']).reset_index(drop = True)
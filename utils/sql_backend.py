@@ -0,0 +1,611 @@
+""" Embedded SQL backend
+
+    With FOME_ZERO_BACKEND=duckdb (or sqlite) the cleaned restaurants are stored once in a database
+    file next to the csv, and the Countries, Cities and Cuisines computations run as indexed queries,
+    so only their result rows are read into each process. DuckDB is optional: when it is not
+    installed the backend uses the sqlite3 module of the standard library.
+
+    Usage:
+        FOME_ZERO_BACKEND=duckdb python -m utils.sql_backend [CSV]
+        FOME_ZERO_BACKEND=duckdb streamlit run Home.py
+
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from contextlib import closing
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data_loader import DATASET_PATH, BACKEND, MAX_SELECTIONS, cached_build, country_options, dataset_version
+from utils.instrumentation import timed
+
+
+#===============================================================================================
+# Settings
+#===============================================================================================
+
+# Bump when the tables change, so databases written by older code are rebuilt
+SCHEMA_VERSION = '2'
+
+# Rows inserted per batch when the database is built
+INSERT_ROWS = 100000
+
+INDEXES = [
+    'CREATE INDEX restaurants_country_city ON restaurants (country, city)',
+    'CREATE INDEX restaurants_cuisines ON restaurants (cuisines)',
+    'CREATE INDEX restaurants_rating ON restaurants (aggregate_rating, restaurant_id)',
+    'CREATE INDEX restaurant_cuisines_row ON restaurant_cuisines (row_id)',
+    'CREATE INDEX restaurant_cuisines_cuisine ON restaurant_cuisines (cuisine)',
+]
+
+# Query results shared by every Streamlit session: {absolute path: {'version': dataset version, 'path': database path, 'results': {key: value}}},
+# where the results of sidebar selections are kept in one LRU per kind
+_RESULTS = {}
+_RESULTS_LOCK = threading.RLock()
+
+
+
+#===============================================================================================
+# Functions
+#===============================================================================================
+
+def engine():
+
+    """ This function returns the database engine in use
+
+        Input: None
+        Output: 'duckdb' when it is requested and installed, otherwise 'sqlite'
+
+    """
+
+    if BACKEND == 'duckdb':
+        try:
+            import duckdb
+        except ImportError:
+            return 'sqlite'
+        return 'duckdb'
+
+    return 'sqlite'
+
+
+
+
+
+def database_path(csv_path):
+
+    """ This function returns the path of the database stored next to the csv file
+
+        Input: Csv path
+        Output: Database path
+
+    """
+
+    return os.path.splitext(csv_path)[0] + '.' + engine()
+
+
+
+
+
+def connect(path, read_only = True):
+
+    """ This function opens a connection to the database file
+
+        Input: Database path, read_only (True or False)
+        Output: DB-API connection
+
+    """
+
+    if engine() == 'duckdb':
+        import duckdb
+        return duckdb.connect(path, read_only = read_only)
+
+    if read_only:
+        return sqlite3.connect('file:{}?mode=ro'.format(path), uri = True, check_same_thread = False)
+
+    return sqlite3.connect(path)
+
+
+
+
+
+def version_key(path):
+
+    """ This function turns the dataset version into the text stored in the database
+
+        Input: Csv path
+        Output: Text
+
+    """
+
+    return '{}:{}'.format(SCHEMA_VERSION, ':'.join(map(str, dataset_version(path)[1])))
+
+
+
+
+
+def cleaned_batches(csv_path):
+
+    """ This function yields the cleaned dataset in batches
+
+        Operations:
+        1- Streams the csv with the ingest chunks when FOME_ZERO_INGEST_CHUNK_ROWS is set and no delta is logged,
+           so the database is built without the whole dataset in memory
+        2- Otherwise reads the dataset once, replays its delta log and splits it in INSERT_ROWS batches,
+           without keeping it in the process-wide cache
+
+        Input: Csv path
+        Output: Generator of Dataframes
+
+    """
+
+    from utils.data_loader import read_dataset
+    from utils.incremental import logged_deltas, replay
+
+    deltas = logged_deltas(csv_path)
+
+    try:
+        from utils.ingest import CHUNK_ROWS, clean_chunks, scan_dtypes
+    except ImportError:
+        CHUNK_ROWS = 0
+
+    if CHUNK_ROWS and not deltas:
+        yield from clean_chunks(csv_path, CHUNK_ROWS, scan_dtypes(csv_path, CHUNK_ROWS))
+        return
+
+    df1 = replay(read_dataset(csv_path), deltas)
+
+    for start in range(0, len(df1), INSERT_ROWS):
+        yield df1.iloc[start:start + INSERT_ROWS, :]
+
+
+
+
+
+def restaurant_rows(df1, offset, cuisine_offset):
+
+    """ This function prepares a batch of restaurants for the restaurants and restaurant_cuisines tables
+
+        Operations:
+        1- Numbers the rows from offset, keeping the row order of the cleaned dataset
+        2- Turns the category columns into text
+        3- Lists every cuisine of each restaurant with the cuisine index, numbering them from cuisine_offset
+           in the order they are listed, so results can follow the order the pandas groupings see them in
+
+        Input: Cleaned Dataframe, row number of its first row, position of its first listed cuisine
+        Output: Restaurants Dataframe, restaurant cuisines Dataframe
+
+    """
+
+    from utils.cuisines import build_cuisine_index
+
+    restaurants = df1.reset_index(drop = True)
+    restaurants = restaurants.assign(**{col: restaurants[col].astype(object) for col in restaurants.columns if isinstance(restaurants[col].dtype, pd.CategoricalDtype)})
+    restaurants.insert(0, 'row_id', np.arange(offset, offset + len(restaurants), dtype = np.int64))
+
+    index = build_cuisine_index(df1)
+    cuisines = pd.DataFrame({'row_id': index['restaurant'].to_numpy(np.int64) + offset,
+                             'position': np.arange(cuisine_offset, cuisine_offset + len(index), dtype = np.int64),
+                             'cuisine': index['cuisines'].astype(object).to_numpy()})
+
+    return restaurants, cuisines
+
+
+
+
+
+def build_database(csv_path = DATASET_PATH, path = None):
+
+    """ This function writes the cleaned dataset to the database file
+
+        Operations:
+        1- Inserts the cleaned restaurants and their listed cuisines batch by batch
+        2- Creates the indexes on country, city, cuisine and rating once every row is inserted
+        3- Stores the dataset version, so a database of another version is rebuilt
+        4- Writes to a temporary file and renames it, so readers never see a partial database
+
+        Input: Csv path, database path (next to the csv when not given)
+        Output: Database path
+
+    """
+
+    path = path or database_path(csv_path)
+    version = version_key(csv_path)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    offset = 0
+    cuisine_offset = 0
+
+    with closing(connect(tmp_path, read_only = False)) as con:
+
+        for df1 in cleaned_batches(csv_path):
+
+            restaurants, cuisines = restaurant_rows(df1, offset, cuisine_offset)
+            offset += len(restaurants)
+            cuisine_offset += len(cuisines)
+
+            if engine() == 'duckdb':
+                for table, rows in [('restaurants', restaurants), ('restaurant_cuisines', cuisines)]:
+                    con.register('batch', rows)
+                    con.execute('CREATE TABLE IF NOT EXISTS {0} AS SELECT * FROM batch LIMIT 0'.format(table))
+                    con.execute('INSERT INTO {} SELECT * FROM batch'.format(table))
+                    con.unregister('batch')
+            else:
+                restaurants.to_sql('restaurants', con, if_exists = 'append', index = False)
+                cuisines.to_sql('restaurant_cuisines', con, if_exists = 'append', index = False)
+
+        for statement in INDEXES:
+            con.execute(statement)
+
+        con.execute('CREATE TABLE metadata (key TEXT, value TEXT)')
+        con.execute("INSERT INTO metadata VALUES ('version', ?)", [version])
+        con.commit()
+
+    os.replace(tmp_path, path)
+
+    return path
+
+
+
+
+
+def database_version(path):
+
+    """ This function reads the dataset version stored in the database
+
+        Input: Database path
+        Output: Version text, or None when the database is missing or unreadable
+
+    """
+
+    if not os.path.exists(path):
+        return None
+
+    errors = (OSError, sqlite3.Error)
+
+    if engine() == 'duckdb':
+        import duckdb
+        errors += (duckdb.Error,)
+
+    try:
+        with closing(connect(path)) as con:
+            return con.execute("SELECT value FROM metadata WHERE key = 'version'").fetchone()[0]
+    except errors:
+        return None
+
+
+
+
+
+def results_entry(csv_path = DATASET_PATH):
+
+    """ This function returns the cached results of the current dataset version
+
+        Operations:
+        1- Drops the cached results when the dataset changed
+        2- Rebuilds the database when it is missing or stores another version
+        3- Holds _RESULTS_LOCK only for those checks, so the queries themselves run in parallel
+
+        Input: Csv path
+        Output: Results entry
+
+    """
+
+    csv_path = os.path.abspath(csv_path)
+    version = version_key(csv_path)
+
+    with _RESULTS_LOCK:
+
+        entry = _RESULTS.get(csv_path)
+
+        if entry is None or entry['version'] != version:
+            path = database_path(csv_path)
+            if database_version(path) != version:
+                with timed('database_build'):
+                    build_database(csv_path, path)
+            entry = {'version': version, 'path': path, 'results': {}}
+            _RESULTS[csv_path] = entry
+
+        return entry
+
+
+
+
+
+def run_query(path, builder):
+
+    """ This function calls builder with its own read-only connection to the database
+
+        Input: Database path, builder function
+        Output: Query result
+
+    """
+
+    with closing(connect(path)) as con:
+        return builder(con)
+
+
+
+
+
+def query_result(key, builder, csv_path = DATASET_PATH):
+
+    """ This function returns a query result, running the query once per dataset version
+
+        Operations:
+        1- Finds the results of the current dataset version with results_entry
+        2- Reuses the result stored under key, otherwise runs builder through cached_build,
+           so concurrent callers of the same key wait for a single query while other queries go on
+
+        Input: Result key, builder function, csv path
+        Output: Query result
+
+    """
+
+    entry = results_entry(csv_path)
+
+    return cached_build(entry['results'], key, lambda: run_query(entry['path'], builder))
+
+
+
+
+
+def selection_result(name, key, builder, csv_path = DATASET_PATH):
+
+    """ This function returns a query result of a sidebar selection, running the query once per selection and dataset version
+
+        Operations:
+        1- Keeps the results of each kind in an LRU of at most MAX_SELECTIONS selections, as selection_artifact
+        2- Reuses the result of the selection, otherwise runs builder through cached_build
+
+        Input: Result kind, selection key, builder function, csv path
+        Output: Query result
+
+    """
+
+    entry = results_entry(csv_path)
+    results = cached_build(entry['results'], name, OrderedDict)
+
+    return cached_build(results, key, lambda: run_query(entry['path'], builder), MAX_SELECTIONS)
+
+
+
+
+
+def read_query(con, sql, params = ()):
+
+    """ This function runs a query and reads its result rows
+
+        Input: Connection, SQL text, query parameters
+        Output: Dataframe
+
+    """
+
+    cursor = con.execute(sql, list(params))
+    columns = [column[0] for column in cursor.description]
+
+    return pd.DataFrame(cursor.fetchall(), columns = columns)
+
+
+
+
+
+def placeholders(values):
+
+    """ This function returns one query parameter placeholder per value
+
+        Input: List of values
+        Output: Text
+
+    """
+
+    return ', '.join(['?'] * len(values)) or 'NULL'
+
+
+
+
+
+def sql_country_options(csv_path = DATASET_PATH):
+
+    """ This function lists the countries offered on the sidebar country selection
+
+        Input: Csv path
+        Output: List of country names
+
+    """
+
+    countries = query_result('country_options', lambda con: read_query(con, 'SELECT DISTINCT country FROM restaurants'), csv_path)
+
+    return country_options(countries)
+
+
+
+
+
+def sql_cuisine_options(csv_path = DATASET_PATH):
+
+    """ This function lists the primary cuisines offered on the sidebar cuisine selection
+
+        Input: Csv path
+        Output: List of cuisines in order of appearance
+
+    """
+
+    sql = 'SELECT cuisines FROM restaurants WHERE cuisines IS NOT NULL GROUP BY cuisines ORDER BY MIN(row_id)'
+
+    return query_result('cuisine_options', lambda con: list(read_query(con, sql)['cuisines']), csv_path)
+
+
+
+
+
+def sql_country_cube(csv_path = DATASET_PATH):
+
+    """ This function aggregates the restaurants of each country in the database
+
+        Operations:
+        1- Counts, sums and averages the columns of the country cube in one grouped query
+        2- Lists the distinct primary cuisines of each country for the cuisine sets
+        3- Orders the countries by name, as the pandas cube
+
+        Input: Csv path
+        Output: Dataframe indexed by country
+
+    """
+
+    sql = '''
+        SELECT country,
+               COUNT(DISTINCT city) AS city,
+               COUNT(restaurant_id) AS restaurant_id,
+               SUM(votes) AS votes,
+               AVG(aggregate_rating) AS aggregate_rating,
+               SUM(aggregate_rating) AS rating_sum,
+               COUNT(aggregate_rating) AS rating_count,
+               COUNT(DISTINCT cuisines) AS cuisines
+        FROM restaurants
+        GROUP BY country
+        ORDER BY country
+    '''
+
+    def builder(con):
+        cube = read_query(con, sql).set_index('country')
+        sets = read_query(con, 'SELECT DISTINCT country, cuisines FROM restaurants WHERE cuisines IS NOT NULL')
+        sets = sets.groupby('country')['cuisines'].agg(frozenset)
+        cube['cuisine_set'] = [sets.get(country, frozenset()) for country in cube.index]
+        return cube
+
+    return query_result('country_cube', builder, csv_path)
+
+
+
+
+
+def sql_city_rankings(country_select, csv_path = DATASET_PATH):
+
+    """ This function counts every per city value ranked on the Cities page in the database
+
+        Operations:
+        1- Counts the restaurants of each city of the selected countries
+        2- Counts them by RATING_BIN wide aggregate_rating bin, pivoted into the city rating histogram
+        3- Counts the distinct listed cuisines of each city through the restaurant_cuisines table
+        4- Orders the cities by their first restaurant, as the pandas rankings
+
+        Input: List of selected countries, csv path
+        Output: Dictionary of Series indexed by city and the city rating histogram
+
+    """
+
+    from utils.cities import RATING_BIN
+
+    countries = sorted(country_select)
+    where = 'country IN ({})'.format(placeholders(countries))
+
+    def builder(con):
+
+        restaurants = read_query(con, 'SELECT city, COUNT(restaurant_id) AS restaurant_id FROM restaurants WHERE {} GROUP BY city ORDER BY MIN(row_id)'.format(where), countries)
+
+        histogram = read_query(con, '''
+            SELECT city, ROUND(aggregate_rating / {}) AS rating_bin, COUNT(*) AS restaurants, MIN(row_id) AS first_row
+            FROM restaurants
+            WHERE aggregate_rating IS NOT NULL AND {}
+            GROUP BY city, rating_bin
+        '''.format(float(RATING_BIN), where), countries)
+        cities = histogram.groupby('city', sort = False)['first_row'].min().sort_values().index
+        histogram = histogram.pivot(index = 'city', columns = 'rating_bin', values = 'restaurants').fillna(0).astype(np.int64)
+        histogram = histogram.reindex(cities).sort_index(axis = 1)
+        histogram.columns = np.round(histogram.columns * RATING_BIN, 1)
+
+        cuisines = read_query(con, '''
+            SELECT r.city, COUNT(DISTINCT c.cuisine) AS cuisines
+            FROM restaurants r JOIN restaurant_cuisines c ON c.row_id = r.row_id
+            WHERE r.{}
+            GROUP BY r.city
+            ORDER BY MIN(r.row_id)
+        '''.format(where), countries)
+
+        return {'restaurants': restaurants.set_index('city')['restaurant_id'],
+                'rating_histogram': histogram,
+                'cuisines': cuisines.set_index('city')['cuisines']}
+
+    return selection_result('city_rankings', frozenset(country_select), builder, csv_path)
+
+
+
+
+
+def sql_cuisine_summary(country_select, cuisines_select, csv_path = DATASET_PATH):
+
+    """ This function summarizes the ratings of every selected cuisine in the database
+
+        Operations:
+        1- Joins the restaurants of the selected countries and primary cuisines with their listed cuisines
+        2- Keeps the selected listed cuisines, except Others
+        3- Sums and counts the aggregate_rating of each cuisine and takes their average
+        4- Orders the cuisines by their first listing, as the pandas summary
+
+        Input: List of selected countries, list of selected cuisines, csv path
+        Output: Dataframe indexed by cuisine with rating_sum, rating_count and aggregate_rating
+
+    """
+
+    countries, cuisines = sorted(country_select), sorted(cuisines_select)
+    sql = '''
+        SELECT c.cuisine AS cuisines, SUM(r.aggregate_rating) AS rating_sum, COUNT(r.aggregate_rating) AS rating_count
+        FROM restaurants r JOIN restaurant_cuisines c ON c.row_id = r.row_id
+        WHERE r.country IN ({0}) AND r.cuisines IN ({1}) AND c.cuisine IN ({1}) AND c.cuisine <> 'Others'
+        GROUP BY c.cuisine
+        ORDER BY MIN(c.position)
+    '''.format(placeholders(countries), placeholders(cuisines))
+
+    def builder(con):
+        summary = read_query(con, sql, countries + cuisines + cuisines).set_index('cuisines')
+        summary['aggregate_rating'] = summary['rating_sum'] / summary['rating_count']
+        return summary
+
+    return selection_result('cuisine_summary', (frozenset(country_select), frozenset(cuisines_select)), builder, csv_path)
+
+
+
+
+
+def sql_top_restaurants(country_select, cuisines_select, top_n, csv_path = DATASET_PATH):
+
+    """ This function selects the restaurants of a sidebar selection with the highest ratings in the database
+
+        Operations:
+        1- Filters the selected countries and primary cuisines
+        2- Orders by aggregate_rating (descending) and restaurant_id (ascending) and keeps the first top_n rows
+
+        Input: List of selected countries, list of selected cuisines, number of restaurants, csv path
+        Output: Dataframe
+
+    """
+
+    countries, cuisines = sorted(country_select), sorted(cuisines_select)
+    sql = '''
+        SELECT restaurant_name, restaurant_id, aggregate_rating, currency
+        FROM restaurants
+        WHERE country IN ({}) AND cuisines IN ({})
+        ORDER BY aggregate_rating DESC, restaurant_id ASC
+        LIMIT {}
+    '''.format(placeholders(countries), placeholders(cuisines), max(int(top_n), 0))
+
+    key = (frozenset(country_select), frozenset(cuisines_select), max(int(top_n), 0))
+
+    return selection_result('top_restaurants', key, lambda con: read_query(con, sql, countries + cuisines), csv_path)
+
+
+
+
+
+if __name__ == '__main__':
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DATASET_PATH
+    print(build_database(csv_path))